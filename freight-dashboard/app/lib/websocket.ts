@@ -1,28 +1,103 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 
 const SOCKET_URL = "ws://localhost:8000/ws";  // ✅ Match FastAPI WebSocket
+const SNAPSHOT_TIMEOUT_MS = 10000;  // ask for the snapshot again if it has not arrived by then
 
 interface WebSocketMessage {
   type: string;
+  version?: number;
   payload: any;
 }
 
+// Replace rows that share a key with the incoming ones and append the rest
+function mergeRows(prev: any[], rows: any[], key: string) {
+  const incoming = new Map(rows.map((row) => [row[key], row]));
+  const merged = prev.map((row) => {
+    const updated = incoming.get(row[key]);
+    if (updated) {
+      incoming.delete(row[key]);
+      return updated;
+    }
+    return row;
+  });
+  return [...merged, ...incoming.values()];
+}
+
+// Overwrite the given fields of rows that share a key; rows not yet known are ignored
+function patchRows(prev: any[], patches: any[], key: string) {
+  const incoming = new Map(patches.map((patch) => [patch[key], patch]));
+  return prev.map((row) => {
+    const patch = incoming.get(row[key]);
+    return patch ? { ...row, ...patch } : row;
+  });
+}
+
 export function useWebSocket() {
   const [socket, setSocket] = useState<WebSocket | null>(null);
   const [freighterUpdates, setFreighterUpdates] = useState<any[]>([]);
   const [shipmentUpdates, setShipmentUpdates] = useState<any[]>([]);
   const [activeUsers, setActiveUsers] = useState<any[]>([]);
   const [matchUpdates, setMatchUpdates] = useState<any[]>([]);
+  const [metrics, setMetrics] = useState<any | null>(null);
+  const version = useRef<number | null>(null);
+  // Deltas received while waiting for a snapshot, replayed on top of it
+  const pending = useRef<WebSocketMessage[]>([]);
+  const snapshotTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
 
   useEffect(() => {
     const ws = new WebSocket(SOCKET_URL);
 
-    ws.onopen = () => console.log("Connected to WebSocket");
-    
-    ws.onmessage = (event) => {
-      const message: WebSocketMessage = JSON.parse(event.data);
-      console.log("WebSocket Received:", message);
+    const clearSnapshotTimer = () => {
+      if (snapshotTimer.current !== null) {
+        clearTimeout(snapshotTimer.current);
+        snapshotTimer.current = null;
+      }
+    };
+
+    // The server sends a snapshot on connect; if it never arrives, ask again
+    const waitForSnapshot = () => {
+      clearSnapshotTimer();
+      snapshotTimer.current = setTimeout(requestSnapshot, SNAPSHOT_TIMEOUT_MS);
+    };
+
+    const requestSnapshot = () => {
+      version.current = null;
+      pending.current = [];
+      if (ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: "resync" }));
+      }
+      waitForSnapshot();
+    };
+
+    // Apply a versioned delta in order; returns false (after asking for a resync) on a gap
+    const applyVersioned = (message: WebSocketMessage) => {
+      const messageVersion = message.version as number;
+      if (version.current === null || messageVersion <= version.current) return true;
+      if (messageVersion !== version.current + 1) {
+        requestSnapshot();
+        return false;
+      }
+      version.current = messageVersion;
+      applyMessage(message);
+      return true;
+    };
+
+    const applySnapshot = (message: WebSocketMessage) => {
+      clearSnapshotTimer();
+      version.current = message.version ?? 0;
+      setFreighterUpdates(message.payload.freighters);
+      setShipmentUpdates(message.payload.shipments);
+      setMatchUpdates(message.payload.matches);
 
+      // Deltas newer than the snapshot were broadcast while it was being read
+      const buffered = pending.current.sort((a, b) => (a.version as number) - (b.version as number));
+      pending.current = [];
+      for (const delta of buffered) {
+        if (!applyVersioned(delta)) break;
+      }
+    };
+
+    const applyMessage = (message: WebSocketMessage) => {
       switch (message.type) {
         case "user_login":
           setActiveUsers((prev) => [...prev, message.payload])
@@ -31,22 +106,59 @@ export function useWebSocket() {
           setActiveUsers((prev) => prev.filter(u => u.userid !== message.payload.userid))
           break;
         case "freighter_update":
-          setFreighterUpdates((prev) => message.payload);
+          setFreighterUpdates((prev) => mergeRows(prev, message.payload, "scheduleid"));
           break;
         case "shipment_update":
-          setShipmentUpdates((prev) => message.payload);
+          setShipmentUpdates((prev) => mergeRows(prev, message.payload, "requestid"));
+          break;
+        case "freighter_moved":
+          setFreighterUpdates((prev) => patchRows(prev, message.payload, "scheduleid"));
+          break;
+        case "shipment_moved":
+          setShipmentUpdates((prev) => patchRows(prev, message.payload, "requestid"));
           break;
         case "match_update":
-          setMatchUpdates(prev => message.payload)
+          setMatchUpdates((prev) => mergeRows(prev, message.payload, "matchid"));
+          break;
+        case "metrics_update":
+          // Rolling-window aggregates of the backend worker this socket is connected to
+          setMetrics(message.payload);
+          break;
         default:
           console.warn("Unknown WebSocket message type:", message.type);
       }
     };
 
-    ws.onclose = () => console.log("WebSocket Disconnected");
+    ws.onopen = () => {
+      console.log("Connected to WebSocket");
+      waitForSnapshot();
+    };
+
+    ws.onmessage = (event) => {
+      const message: WebSocketMessage = JSON.parse(event.data);
+      console.log("WebSocket Received:", message);
+
+      if (message.type === "snapshot") {
+        applySnapshot(message);
+      } else if (message.version === undefined) {
+        applyMessage(message);
+      } else if (version.current === null) {
+        pending.current.push(message);
+      } else {
+        applyVersioned(message);
+      }
+    };
+
+    ws.onclose = () => {
+      clearSnapshotTimer();
+      console.log("WebSocket Disconnected");
+    };
 
     setSocket(ws);
-    return () => ws.close();
+    return () => {
+      clearSnapshotTimer();
+      ws.close();
+    };
   }, []);
 
   const sendMessage = (type: string, payload: any) => {
@@ -55,5 +167,5 @@ export function useWebSocket() {
     }
   };
 
-  return { activeUsers, freighterUpdates, shipmentUpdates, matchUpdates, sendMessage };
+  return { activeUsers, freighterUpdates, shipmentUpdates, matchUpdates, metrics, sendMessage };
 }
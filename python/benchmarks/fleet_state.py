@@ -0,0 +1,81 @@
+"""
+Scaling of the FleetState indexes against the linear scans they replace.
+
+    cd python && python -m benchmarks.fleet_state [sizes...]
+
+For each size N (schedules = matches = shipments = N) it times one simulator
+tick's worth of scheduleid -> match lookups and one matcher pass's pending
+shipment filter. Linear lookups are sampled (at most 1,000) and scaled to N,
+since the full O(N^2) scan is impractical at 100k.
+"""
+import sys
+import time
+import uuid
+import random
+from fleet import FleetState
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000]
+LOOKUP_SAMPLE = 1_000
+
+
+def make_rows(n):
+    scheduleids = [str(uuid.uuid4()) for _ in range(n)]
+    requestids = [str(uuid.uuid4()) for _ in range(n)]
+    matches = [
+        {"matchid": str(uuid.uuid4()), "scheduleid": s, "requestid": r, "status": "matched"}
+        for s, r in zip(scheduleids, requestids)
+    ]
+    shipments = [
+        {"requestid": r, "status": "pending" if random.random() < 0.1 else "matched"}
+        for r in requestids
+    ]
+    random.shuffle(matches)
+    return scheduleids, matches, shipments
+
+
+def bench(n):
+    scheduleids, matches, shipments = make_rows(n)
+    sample = random.sample(scheduleids, min(n, LOOKUP_SAMPLE))
+
+    start = time.perf_counter()
+    for scheduleid in sample:
+        next((m for m in matches if m["scheduleid"] == scheduleid), None)
+    linear_lookup = (time.perf_counter() - start) * n / len(sample)
+
+    start = time.perf_counter()
+    fleet = FleetState()
+    fleet.replace_matches(matches)
+    for scheduleid in scheduleids:
+        fleet.match_for_schedule(scheduleid)
+    indexed_lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    [s for s in shipments if s["status"] == "pending"]
+    linear_filter = time.perf_counter() - start
+
+    for shipment in shipments:
+        fleet.upsert_shipment(shipment)
+    start = time.perf_counter()
+    fleet.shipments_with_status("pending")
+    indexed_filter = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for shipment in shipments[:LOOKUP_SAMPLE]:
+        fleet.upsert_shipment({**shipment, "status": "matched"})
+    upsert = (time.perf_counter() - start) / min(n, LOOKUP_SAMPLE)
+
+    return linear_lookup, indexed_lookup, linear_filter, indexed_filter, upsert
+
+
+def main(sizes):
+    print(f"{'N':>8} {'scan lookups (s)':>17} {'index lookups (s)':>18} {'scan filter (ms)':>17} {'index filter (ms)':>18} {'upsert (us)':>12}")
+    for n in sizes:
+        linear_lookup, indexed_lookup, linear_filter, indexed_filter, upsert = bench(n)
+        print(
+            f"{n:>8} {linear_lookup:>17.4f} {indexed_lookup:>18.4f} "
+            f"{linear_filter * 1000:>17.3f} {indexed_filter * 1000:>18.3f} {upsert * 1e6:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
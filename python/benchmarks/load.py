@@ -0,0 +1,364 @@
+"""
+Load generator for the HTTP API, built from the users and payloads of
+data/simulation.py.
+
+    cd python && uvicorn index:app                  # against a local Postgres (env.json)
+    cd python && python -m benchmarks.load --users 2000 --mode open --rps 500 --duration 60 --out run.json
+    cd python && python -m benchmarks.load --mode closed --concurrency 200 --compare run.json
+
+Every operation is one request by a random user: freighters post a new
+departure for their schedule, suppliers post a shipment request, and with
+probability --read-ratio the user lists schedules, requests or matches
+instead (--login-ratio adds logins, which are dominated by bcrypt).
+
+open:   operations start at a constant --rps whether or not earlier ones
+        finished; latency is measured from the scheduled start, so a server
+        (or client) falling behind shows up as latency, not as lower load.
+        Operations beyond --max-in-flight are dropped and counted.
+closed: --concurrency workers each run operations back to back, with
+        --think-ms between them.
+
+Per endpoint it reports throughput, error rate (non-2xx and client
+errors), the status breakdown and a latency histogram with p50/p95/p99.
+--out writes the results as JSON; --compare checks them against an earlier
+run's JSON and exits 1 on a regression beyond --tolerance.
+"""
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime
+import aiohttp
+from data.simulation import BASE_URL, CITIES, make_freighter, make_supplier, random_shipment
+
+READS = [
+    ("GET /freighters/schedules", "/freighters/schedules?limit=100"),
+    ("GET /shipments/requests", "/shipments/requests?status=pending&limit=100"),
+    ("GET /shipments/matches", "/shipments/matches?limit=100")
+]
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram: bucket i holds latencies up to
+    MIN_MS * GROWTH ** i, so percentiles are within ~4% and memory stays
+    bounded however many requests are recorded.
+    """
+    MIN_MS = 0.01
+    GROWTH = 1.04
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = math.inf
+        self.max_ms = 0.0
+
+    def bucket(self, ms):
+        if ms <= self.MIN_MS:
+            return 0
+        return math.ceil(math.log(ms / self.MIN_MS, self.GROWTH))
+
+    def upper_ms(self, bucket):
+        return self.MIN_MS * self.GROWTH ** bucket
+
+    def record(self, ms):
+        self.buckets[self.bucket(ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.upper_ms(bucket), self.max_ms)
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            "min": self.min_ms if self.count else 0.0,
+            "mean": self.total_ms / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max_ms,
+            "buckets": [[round(self.upper_ms(b), 3), self.buckets[b]] for b in sorted(self.buckets)]
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.statuses = Counter()
+        self.errors = 0
+
+    def record(self, ms, status):
+        self.latency.record(ms)
+        self.statuses[str(status)] += 1
+        if not (isinstance(status, int) and 200 <= status < 300):
+            self.errors += 1
+
+
+class LoadRun:
+    """Issues the operations and records them per endpoint."""
+
+    def __init__(self, base_url, users, read_ratio, login_ratio):
+        self.base_url = base_url
+        self.users = users
+        self.read_ratio = read_ratio
+        self.login_ratio = login_ratio
+        self.endpoints = defaultdict(EndpointStats)
+        self.dropped = 0
+        self.started = None
+        self.finished = None
+
+    async def request(self, session, method, label, path, scheduled=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            async with session.request(method, f"{self.base_url}{path}", **kwargs) as resp:
+                await resp.read()
+                status = resp.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = type(e).__name__
+        self.endpoints[label].record((time.perf_counter() - (scheduled or start)) * 1000, status)
+
+    async def operation(self, session, user, scheduled=None):
+        roll = random.random()
+
+        if roll < self.login_ratio:
+            await self.request(session, "POST", "POST /users/login", "/users/login", scheduled, json={
+                "name": user["name"], "email": user["email"], "password": user["password"]
+            })
+        elif roll < self.login_ratio + self.read_ratio:
+            label, path = random.choice(READS)
+            await self.request(session, "GET", label, path, scheduled)
+        elif user["role"] == "Freighter":
+            # A new departure every time, so the upsert always writes
+            city = random.choice(CITIES)
+            schedule = {**user, "departurecity": city[0], "departurelat": city[1], "departurelng": city[2]}
+            await self.request(session, "POST", "POST /freighters/schedules", "/freighters/schedules", scheduled, json=schedule)
+        else:
+            await self.request(
+                session, "POST", "POST /shipments/requests", "/shipments/requests", scheduled,
+                json=random_shipment(str(user["userid"]))
+            )
+
+    async def open_loop(self, session, rps, duration, max_in_flight):
+        in_flight = set()
+        interval = 1 / rps
+        start = time.perf_counter()
+        n = 0
+
+        while n * interval < duration:
+            scheduled = start + n * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if len(in_flight) >= max_in_flight:
+                self.dropped += 1
+            else:
+                task = asyncio.create_task(self.operation(session, random.choice(self.users), scheduled))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            n += 1
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def closed_loop(self, session, concurrency, duration, think_ms):
+        deadline = time.perf_counter() + duration
+
+        async def worker(user):
+            while time.perf_counter() < deadline:
+                await self.operation(session, user)
+                if think_ms:
+                    await asyncio.sleep(think_ms / 1000)
+
+        await asyncio.gather(*(worker(self.users[i % len(self.users)]) for i in range(concurrency)))
+
+    async def run(self, session, args, duration):
+        self.started = time.perf_counter()
+        if args.mode == "open":
+            await self.open_loop(session, args.rps, duration, args.max_in_flight)
+        else:
+            await self.closed_loop(session, args.concurrency, duration, args.think_ms)
+        self.finished = time.perf_counter()
+
+    def results(self, config):
+        elapsed = self.finished - self.started
+        requests = sum(e.latency.count for e in self.endpoints.values())
+        errors = sum(e.errors for e in self.endpoints.values())
+        return {
+            "started_at": datetime.now().isoformat(),
+            "config": config,
+            "duration_s": elapsed,
+            "totals": {
+                "requests": requests,
+                "errors": errors,
+                "dropped": self.dropped,
+                "error_rate": errors / requests if requests else 0.0,
+                "throughput_rps": requests / elapsed if elapsed else 0.0
+            },
+            "endpoints": {
+                label: {
+                    "requests": e.latency.count,
+                    "errors": e.errors,
+                    "error_rate": e.errors / e.latency.count if e.latency.count else 0.0,
+                    "throughput_rps": e.latency.count / elapsed if elapsed else 0.0,
+                    "statuses": dict(e.statuses),
+                    "latency_ms": e.latency.to_dict()
+                }
+                for label, e in sorted(self.endpoints.items())
+            }
+        }
+
+
+def make_users(count, freighter_share, prefix):
+    freighters = round(count * freighter_share)
+    return (
+        [make_freighter(f"{prefix} Freighter {i+1}", f"{prefix.lower()}-freighter{i+1}@test.com") for i in range(freighters)]
+        + [make_supplier(f"{prefix} Supplier {i+1}", f"{prefix.lower()}-supplier{i+1}@test.com") for i in range(count - freighters)]
+    )
+
+
+async def setup_users(session, base_url, users, concurrency):
+    """Log every user in, registering the ones that don't exist yet. Returns the users that are ready."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def setup(user):
+        async with semaphore:
+            credentials = {"name": user["name"], "email": user["email"], "password": user["password"]}
+            async with session.post(f"{base_url}/users/login", json=credentials) as resp:
+                if resp.status != 200:
+                    async with session.post(f"{base_url}/users/register", json={
+                        **credentials, "userid": str(user["userid"]), "role": user["role"]
+                    }) as resp:
+                        if resp.status != 200:
+                            return None
+                        data = await resp.json()
+                else:
+                    data = await resp.json()
+
+        # Users from an earlier run keep the ids they were registered with
+        user["userid"] = data["userid"]
+        if user["role"] == "Freighter":
+            user["freighterid"] = data["userid"]
+        return user
+
+    ready = await asyncio.gather(*(setup(user) for user in users))
+    return [user for user in ready if user is not None]
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline (lists of messages)."""
+    regressions = []
+
+    old, new = baseline["totals"], results["totals"]
+    if new["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {old['throughput_rps']:.1f} -> {new['throughput_rps']:.1f} req/s")
+    if new["error_rate"] > old["error_rate"] + tolerance:
+        regressions.append(f"error rate {old['error_rate']:.2%} -> {new['error_rate']:.2%}")
+
+    for label, endpoint in results["endpoints"].items():
+        if label not in baseline["endpoints"]:
+            continue
+        old_p99 = baseline["endpoints"][label]["latency_ms"]["p99"]
+        new_p99 = endpoint["latency_ms"]["p99"]
+        if new_p99 > old_p99 * (1 + tolerance):
+            regressions.append(f"{label} p99 {old_p99:.1f} -> {new_p99:.1f} ms")
+
+    return regressions
+
+
+def print_summary(results):
+    totals = results["totals"]
+    print(
+        f"\n{totals['requests']:,} requests in {results['duration_s']:.1f}s: "
+        f"{totals['throughput_rps']:,.1f} req/s, {totals['error_rate']:.2%} errors, {totals['dropped']:,} dropped"
+    )
+    print(f"{'endpoint':<30} {'req/s':>9} {'errors':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for label, endpoint in results["endpoints"].items():
+        latency = endpoint["latency_ms"]
+        print(
+            f"{label:<30} {endpoint['throughput_rps']:>9,.1f} {endpoint['error_rate']:>8.2%} "
+            f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} {latency['max']:>9.1f}"
+        )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Load generator for the Freight Broker API")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--freighter-share", type=float, default=0.4, help="fraction of users that are freighters")
+    parser.add_argument("--prefix", default="Load", help="user name prefix, so runs reuse their users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--rps", type=float, default=200.0, help="open loop: operations started per second")
+    parser.add_argument("--max-in-flight", type=int, default=5000, help="open loop: operations dropped beyond this")
+    parser.add_argument("--concurrency", type=int, default=100, help="closed loop: concurrent workers")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="closed loop: pause between a worker's operations")
+    parser.add_argument("--read-ratio", type=float, default=0.5)
+    parser.add_argument("--login-ratio", type=float, default=0.0)
+    parser.add_argument("--connections", type=int, default=1000, help="client connection limit")
+    parser.add_argument("--setup-concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+async def main(args):
+    random.seed(args.seed)
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        users = await setup_users(session, args.base_url, make_users(args.users, args.freighter_share, args.prefix), args.setup_concurrency)
+        print(f"{len(users)}/{args.users} users ready, {args.mode} loop")
+        if not users:
+            return 1
+        # Closed-loop workers take users in order; mix freighters and suppliers
+        random.shuffle(users)
+
+        if args.warmup:
+            await LoadRun(args.base_url, users, args.read_ratio, args.login_ratio).run(session, args, args.warmup)
+
+        run = LoadRun(args.base_url, users, args.read_ratio, args.login_ratio)
+        await run.run(session, args, args.duration)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    results = run.results(config)
+    print_summary(results)
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nWrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"\nNo regressions against {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args(sys.argv[1:]))))
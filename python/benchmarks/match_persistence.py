@@ -0,0 +1,90 @@
+"""
+Compare the ORM and bulk match persistence paths used by the matcher.
+
+    cd python && python -m benchmarks.match_persistence [sizes...]
+
+Runs against the database in env.json. Every run seeds its own freighters and
+shipments inside a transaction that is rolled back, so existing rows are left
+untouched.
+"""
+import sys
+import time
+import uuid
+from sqlalchemy import select, text
+from startup import connect_db_sync
+from models import FreighterSchedules, ShipmentRequests
+from service import apply_matches, match_rows, model_row, persist_matches_bulk
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+BENCH_CITY = "benchmark"
+
+
+def seed(session, n):
+    scheduleids = [str(uuid.uuid4()) for _ in range(n)]
+    requestids = [str(uuid.uuid4()) for _ in range(n)]
+
+    session.execute(text("""
+        INSERT INTO freighterschedules (scheduleid, departurecity, departurelat, departurelng, maxloadkg, availablekg, status)
+        SELECT id, :city, 40.0, -90.0, 50000, 25000, 'available'
+        FROM unnest(CAST(:ids AS uuid[])) AS id
+    """), {"ids": scheduleids, "city": BENCH_CITY})
+    session.execute(text("""
+        INSERT INTO shipmentrequests (requestid, origincity, originlat, originlng, destinationlat, destinationlng, weightkg, status)
+        SELECT id, :city, 40.0, -90.0, 35.0, -100.0, 1000, 'pending'
+        FROM unnest(CAST(:ids AS uuid[])) AS id
+    """), {"ids": requestids, "city": BENCH_CITY})
+
+
+def load(session):
+    freighters = session.execute(
+        select(FreighterSchedules).where(FreighterSchedules.departurecity == BENCH_CITY)
+    ).scalars().all()
+    shipments = session.execute(
+        select(ShipmentRequests).where(ShipmentRequests.origincity == BENCH_CITY)
+    ).scalars().all()
+
+    # One shipment per freighter keeps the match count equal to n
+    matches = [(i, i, 24000.0) for i in range(min(len(freighters), len(shipments)))]
+    return freighters, shipments, matches
+
+
+def run_orm(n):
+    session = connect_db_sync()
+    try:
+        seed(session, n)
+        freighters, shipments, matches = load(session)
+
+        start = time.perf_counter()
+        apply_matches(session, freighters, shipments, matches)
+        session.flush()
+        return time.perf_counter() - start
+    finally:
+        session.rollback()
+        session.close()
+
+
+def run_bulk(n):
+    session = connect_db_sync()
+    try:
+        seed(session, n)
+        freighters, shipments, matches = load(session)
+
+        start = time.perf_counter()
+        rows = match_rows([model_row(f) for f in freighters], [model_row(s) for s in shipments], matches)
+        persist_matches_bulk(session, rows)
+        return time.perf_counter() - start
+    finally:
+        session.rollback()
+        session.close()
+
+
+def main(sizes):
+    print(f"{'matches':>10} {'orm (s)':>10} {'bulk (s)':>10} {'speedup':>8}")
+    for n in sizes:
+        orm = run_orm(n)
+        bulk = run_bulk(n)
+        print(f"{n:>10} {orm:>10.3f} {bulk:>10.3f} {orm / bulk:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
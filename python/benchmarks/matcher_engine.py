@@ -0,0 +1,93 @@
+"""
+Tick duration vs row count for the two matcher engines.
+
+    cd python && python -m benchmarks.matcher_engine [sizes...]
+
+A tick is one full pass: read every candidate, match, lock the matched rows
+and persist the matches.
+
+thread: SQLAlchemy session on the psycopg2 engine with ORM rows
+        (matcher.engine = "thread", what runs in the worker thread)
+async:  asyncpg connection from the shared pool with plain records
+        (matcher.engine = "async")
+
+Every run seeds n freighters and n shipments inside a transaction that is
+rolled back, so nothing is left behind. Candidates already in the database
+take part in the tick too, so point env.json at a scratch database.
+"""
+import sys
+import time
+import asyncio
+from sqlalchemy import text
+from startup import connect_db_sync, create_db_pool, close_db_pool, acquire_db
+from service import (
+    select_match_candidates, run_match_pass,
+    select_match_candidates_async, run_match_pass_async
+)
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+
+# Deterministic positions spread over the continental US, so both engines
+# match the same data.
+SEED_SCHEDULES = """
+    INSERT INTO freighterschedules (scheduleid, departurecity, departurelat, departurelng, maxloadkg, availablekg, status)
+    SELECT gen_random_uuid(), 'benchmark', 25 + (i * 7919 % 2400) / 100.0, -124 + (i * 6007 % 5700) / 100.0,
+           25000, 25000, 'available'
+    FROM generate_series(1::bigint, {n}) AS i
+"""
+
+SEED_SHIPMENTS = """
+    INSERT INTO shipmentrequests (requestid, origincity, originlat, originlng, destinationlat, destinationlng, weightkg, status)
+    SELECT gen_random_uuid(), 'benchmark', 25 + (i * 104729 % 2400) / 100.0, -124 + (i * 1299709 % 5700) / 100.0,
+           35.0, -100.0, 500 + i % 1500, 'pending'
+    FROM generate_series(1::bigint, {n}) AS i
+"""
+
+
+def tick_thread(n):
+    session = connect_db_sync()
+    try:
+        session.execute(text(SEED_SCHEDULES.format(n=int(n))))
+        session.execute(text(SEED_SHIPMENTS.format(n=int(n))))
+
+        start = time.perf_counter()
+        freighters, shipments = select_match_candidates(session)
+        matched, _, _ = run_match_pass(session, freighters, shipments)
+        session.flush()
+        return time.perf_counter() - start, len(matched)
+    finally:
+        session.rollback()
+        session.close()
+
+
+async def tick_async(n):
+    async with acquire_db() as conn:
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            await conn.execute(SEED_SCHEDULES.format(n=int(n)))
+            await conn.execute(SEED_SHIPMENTS.format(n=int(n)))
+
+            start = time.perf_counter()
+            freighters, shipments = await select_match_candidates_async(conn)
+            matched, _, _ = await run_match_pass_async(conn, freighters, shipments)
+            return time.perf_counter() - start, len(matched)
+        finally:
+            await transaction.rollback()
+
+
+async def main(sizes):
+    await create_db_pool()
+    try:
+        print(f"{'rows':>10} {'matches':>10} {'thread (s)':>11} {'async (s)':>10} {'speedup':>8}")
+        for n in sizes:
+            # The thread engine runs off the event loop in the app too
+            thread, matched = await asyncio.to_thread(tick_thread, n)
+            native, _ = await tick_async(n)
+            print(f"{n:>10} {matched:>10} {thread:>11.3f} {native:>10.3f} {thread / native:>7.1f}x")
+    finally:
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES))
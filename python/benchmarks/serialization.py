@@ -0,0 +1,92 @@
+"""
+Rows/s of the old and new JSON paths for HTTP responses and broadcasts.
+
+    cd python && python -m benchmarks.serialization [rows]
+
+http:      jsonable_encoder + json.dumps (FastAPI's default response path)
+           vs serialization.dumps on the rows as fetched
+broadcast: SQLModel per row + .dict() + manual conversions + json.dumps
+           vs serialization.shipment_payload + serialization.dumps_text
+
+Rows are real asyncpg Records shaped like shipmentrequests (UUID, Decimal,
+timestamp values), so the new paths go through serialization._default as
+they do in the routes. They are generated by a query, no table is read.
+"""
+import sys
+import json
+import time
+import asyncio
+from fastapi.encoders import jsonable_encoder
+from models import ShipmentRequests
+from startup import connect_db
+from serialization import dumps, dumps_text, orjson, shipment_payload
+
+DEFAULT_ROWS = 100_000
+
+SHIPMENT_ROWS = """
+    SELECT gen_random_uuid() AS requestid, gen_random_uuid() AS clientid,
+           'Origin'::varchar AS origincity, 25 + random() * 24 AS originlat, -124 + random() * 57 AS originlng,
+           'Destination'::varchar AS destinationcity, 25 + random() * 24 AS destinationlat, -124 + random() * 57 AS destinationlng,
+           round((100 + random() * 19900)::numeric, 2) AS weightkg, NULL::varchar AS specialhandling,
+           'pending'::varchar AS status, localtimestamp - i * interval '1 second' AS createdat, localtimestamp AS lastupdated
+    FROM generate_series(1, $1) AS i
+"""
+
+
+async def fetch_shipments(n):
+    conn = await connect_db()
+    try:
+        return await conn.fetch(SHIPMENT_ROWS, n)
+    finally:
+        await conn.close()
+
+
+def old_http(rows):
+    return json.dumps(jsonable_encoder(rows)).encode()
+
+
+def new_http(rows):
+    return dumps(rows)
+
+
+def old_broadcast(rows):
+    payload = []
+    for s in rows:
+        model = ShipmentRequests(**{
+            "requestid": str(s["requestid"]),
+            "clientid": str(s["clientid"]),
+            "origincity": s["origincity"],
+            "originlat": float(s["originlat"]),
+            "originlng": float(s["originlng"]),
+            "destinationcity": s["destinationcity"],
+            "destinationlat": float(s["destinationlat"]),
+            "destinationlng": float(s["destinationlng"]),
+            "weightkg": float(s["weightkg"]),
+            "specialhandling": "none",
+            "status": s["status"],
+            "createdat": s["createdat"],
+            "lastupdated": s["lastupdated"],
+        })
+        payload.append({**model.dict(), "createdat": str(model.createdat), "lastupdated": str(model.lastupdated)})
+    return json.dumps({"type": "shipment_update", "payload": payload})
+
+
+def new_broadcast(rows):
+    return dumps_text({"type": "shipment_update", "payload": [shipment_payload(s) for s in rows]})
+
+
+def rate(fn, rows):
+    start = time.perf_counter()
+    fn(rows)
+    return len(rows) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    rows = asyncio.run(fetch_shipments(n))
+    print(f"encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}, {n:,} rows")
+    print(f"{'path':<10} {'before rows/s':>15} {'after rows/s':>15} {'speedup':>8}")
+    for name, old, new in [("http", old_http, new_http), ("broadcast", old_broadcast, new_broadcast)]:
+        before = rate(old, rows)
+        after = rate(new, rows)
+        print(f"{name:<10} {before:>15,.0f} {after:>15,.0f} {after / before:>7.1f}x")
@@ -0,0 +1,127 @@
+import asyncio
+from collections import deque
+from serialization import dumps_text
+from logs import get_logger
+
+log = get_logger("broadcast")
+
+CLIENT_QUEUE_SIZE = 256
+SEND_TIMEOUT = 5  # seconds a single send may take before the client is evicted
+
+
+class BroadcastClient:
+    def __init__(self, websocket, queue_size):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.queue = deque()  # (message, droppable)
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.task = None
+
+    def offer(self, message, droppable=True):
+        """
+        Queue a message without blocking. When the queue is full the oldest
+        droppable message is dropped; versioned table updates that go missing
+        this way make the client ask for a resync. Snapshots are queued as
+        not droppable, since the client has nothing to resync against
+        without them, and a new one replaces any still queued: only the
+        newest matters, and the queue stays within queue_size however many
+        resyncs a stalled client asks for.
+        """
+        if not droppable:
+            for i, (_, can_drop) in enumerate(self.queue):
+                if not can_drop:
+                    del self.queue[i]
+                    self.dropped += 1
+                    break
+        if len(self.queue) >= self.queue_size:
+            for i, (_, can_drop) in enumerate(self.queue):
+                if can_drop:
+                    del self.queue[i]
+                    self.dropped += 1
+                    break
+        self.queue.append((message, droppable))
+        self.ready.set()
+
+    async def next_message(self):
+        while not self.queue:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.queue.popleft()[0]
+
+    def stats(self):
+        return {
+            "client": f"{self.websocket.client.host}:{self.websocket.client.port}" if self.websocket.client else None,
+            "queue_depth": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped
+        }
+
+
+class BroadcastHub:
+    """
+    Fans messages out to WebSocket clients. Each message is serialized once and
+    handed to a bounded per-client queue drained by its own sender task, so a
+    slow client only ever delays itself. Clients whose sends fail or time out
+    are evicted.
+    """
+
+    def __init__(self, queue_size=CLIENT_QUEUE_SIZE, send_timeout=SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.clients = {}
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.clients)
+
+    def register(self, websocket):
+        client = BroadcastClient(websocket, self.queue_size)
+        client.task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
+        return client
+
+    def unregister(self, websocket):
+        client = self.clients.pop(websocket, None)
+        if client and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def send(self, websocket, message, droppable=True):
+        """Queue a message for a single client."""
+        client = self.clients.get(websocket)
+        if client:
+            client.offer(message if isinstance(message, str) else dumps_text(message), droppable)
+
+    def publish(self, message):
+        """Queue a message for every client."""
+        if not self.clients:
+            return
+        if not isinstance(message, str):
+            message = dumps_text(message)
+        for client in list(self.clients.values()):
+            client.offer(message)
+
+    async def _sender(self, client):
+        while True:
+            message = await client.next_message()
+            try:
+                await asyncio.wait_for(client.websocket.send_text(message), timeout=self.send_timeout)
+                client.sent += 1
+            except Exception as e:
+                log.info("evicting WebSocket client after failed send", error=e)
+                self.evicted += 1
+                self.unregister(client.websocket)
+                try:
+                    await client.websocket.close()
+                except Exception:
+                    pass
+                return
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "evicted": self.evicted,
+            "queue_size": self.queue_size,
+            "per_client": [client.stats() for client in self.clients.values()]
+        }
@@ -0,0 +1,174 @@
+import asyncio
+from startup import connect_db, acquire_db, env
+from serialization import dumps_text, loads
+from logs import get_logger
+
+log = get_logger("cluster")
+
+# Multi-worker mode (uvicorn --workers N). Request handling runs in every
+# worker; the matcher and simulator only run in the worker holding the leader
+# advisory lock, and broadcasts/change events travel between workers over
+# LISTEN/NOTIFY.
+CLUSTER_ENABLED = env.get("cluster", {}).get("enabled", False)
+
+LEADER_LOCK_ID = 7_240_001  # pg_advisory_lock key reserved for the background-task leader
+EVENT_CHANNEL = "freight_events"
+NOTIFY_PAYLOAD_LIMIT = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+HEALTH_CHECK_INTERVAL = env.get("cluster", {}).get("health_check_interval", 5)
+
+
+class LeaderElection:
+    """
+    Holds a session-level advisory lock on a dedicated connection. While the
+    lock is held, start_tasks() is running; if the connection drops (or the
+    process dies) Postgres releases the lock and another worker takes over
+    within HEALTH_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, start_tasks, lock_id=LEADER_LOCK_ID, interval=HEALTH_CHECK_INTERVAL):
+        self.start_tasks = start_tasks
+        self.lock_id = lock_id
+        self.interval = interval
+        self.is_leader = False
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    async def run(self):
+        while True:
+            conn = None
+            tasks = []
+            try:
+                conn = await connect_db()
+
+                while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_id):
+                    await asyncio.sleep(self.interval)
+
+                log.info("elected background-task leader")
+                self.is_leader = True
+                tasks = self.start_tasks()
+
+                # Stay leader for as long as the lock connection is healthy
+                while True:
+                    await asyncio.sleep(self.interval)
+                    await conn.fetchval("SELECT 1")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("leader election connection lost", error=e)
+            finally:
+                self.is_leader = False
+                for task in tasks:
+                    task.cancel()
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+
+            await asyncio.sleep(self.interval)
+
+
+class EventRelay:
+    """
+    Publishes JSON events to every worker (including this one) with NOTIFY and
+    delivers the ones it hears to on_event. on_reconnect is called after the
+    listener connection had to be re-established, since events may have been
+    missed in between.
+    """
+
+    def __init__(self, on_event, on_reconnect=None, channel=EVENT_CHANNEL, interval=HEALTH_CHECK_INTERVAL):
+        self.on_event = on_event
+        self.on_reconnect = on_reconnect
+        self.channel = channel
+        self.interval = interval
+        self.task = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def _listener(self, conn, pid, channel, payload):
+        self.received += 1
+        try:
+            self.on_event(loads(payload))
+        except Exception:
+            log.exception("failed to handle cluster event")
+
+    async def run(self):
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = await connect_db()
+                await conn.add_listener(self.channel, self._listener)
+
+                if connected_before and self.on_reconnect:
+                    self.on_reconnect()
+                connected_before = True
+
+                while True:
+                    await asyncio.sleep(self.interval)
+                    await conn.fetchval("SELECT 1")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("cluster event listener connection lost", error=e)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    conn.terminate()
+
+            await asyncio.sleep(self.interval)
+
+    async def publish(self, event):
+        """
+        NOTIFY an event. Events whose list payload is too large for a single
+        NOTIFY are split into several events carrying part of the list each.
+        """
+        payloads = split_event(event)
+        if not payloads:
+            self.dropped += 1
+            return
+
+        async with acquire_db() as conn:
+            for payload in payloads:
+                await conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                self.published += 1
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped
+        }
+
+
+def split_event(event, key="payload"):
+    payload = dumps_text(event)
+    if len(payload.encode()) <= NOTIFY_PAYLOAD_LIMIT:
+        return [payload]
+
+    message = event.get("message", event)
+    rows = message.get(key)
+    if not isinstance(rows, list) or len(rows) < 2:
+        log.warning("dropping cluster event over the NOTIFY payload limit", limit=NOTIFY_PAYLOAD_LIMIT)
+        return []
+
+    half = len(rows) // 2
+    parts = []
+    for chunk in (rows[:half], rows[half:]):
+        part = {**message, key: chunk}
+        parts.extend(split_event({**event, "message": part} if "message" in event else part, key))
+    return parts
@@ -4,11 +4,27 @@ import aiohttp
 from datetime import datetime, timedelta
 import uuid
 import time
-import traceback
 import math
+import numpy as np
+from startup import acquire_db, env
+from fleet import FleetState
+from matching import haversine_pairwise
+from scheduler import Job
+from logs import get_logger
+
+log = get_logger("simulation")
 
 DAY_LENGTH = 30
 BASE_URL = "http://localhost:8000"
+
+# Client settings shared by every simulated user: one connection pool for the
+# whole simulator, and at most MAX_CONCURRENT_USERS users talking to the API
+# at once, so thousands of users don't open thousands of sockets.
+CONNECTION_LIMIT = env.get("simulation", {}).get("connection_limit", 100)
+CONNECTION_LIMIT_PER_HOST = env.get("simulation", {}).get("connection_limit_per_host", 0)  # 0: only CONNECTION_LIMIT applies
+KEEPALIVE_TIMEOUT = env.get("simulation", {}).get("keepalive_timeout", 30)  # seconds an idle connection is kept open
+REQUEST_TIMEOUT = env.get("simulation", {}).get("request_timeout", 30)
+MAX_CONCURRENT_USERS = env.get("simulation", {}).get("max_concurrent_users", 50)
 REAL_SPEED_KM_H = 50  # Real-world speed (50 km/h)
 SECONDS_IN_REAL_DAY = 86400  # 24 hours * 3600 seconds
 SIMULATION_SECONDS_PER_DAY = DAY_LENGTH  # 30 seconds in our simulation
@@ -45,50 +61,61 @@ ADMIN = {
     "role": "Admin"
 }
 
-FREIGHTERS = []
-
-for i in range(20):
+def make_freighter(name, email):
+    """A freighter user together with the schedule it posts (also used by benchmarks/load.py)."""
     current_city = random.choice(CITIES)
     uid = str(uuid.uuid4())
-    FREIGHTERS.append(
-        {
-            "userid": uid,  # Unique Freighter ID
-            "freighterid": uid,
-            "name": f"Freighter {i+1}",
-            "email": f"freighter{i+1}@test.com",
-            "password": "securepass123",
-            "maxloadkg": random.randint(10000, 50000),
-            "availablekg": random.randint(5000, 25000),
-            "departurecity": current_city[0],
-            "arrivalcity": None,
-            "departurelat": current_city[1],
-            "departurelng": current_city[2],
-            "arrivallat": None,
-            "arrivallng": None,
-            "departuredate": None,
-            "arrivaldate": None,
-            "scheduleid": str(uuid.uuid4()),  # Unique schedule ID
-            "status": "available",  # Can be: Available, In Transit, Completed
-            "lastupdated": str(datetime.utcnow()),
-            "role": "Freighter"
-        }
-    )
+    return {
+        "userid": uid,  # Unique Freighter ID
+        "freighterid": uid,
+        "name": name,
+        "email": email,
+        "password": "securepass123",
+        "maxloadkg": random.randint(10000, 50000),
+        "availablekg": random.randint(5000, 25000),
+        "departurecity": current_city[0],
+        "arrivalcity": None,
+        "departurelat": current_city[1],
+        "departurelng": current_city[2],
+        "arrivallat": None,
+        "arrivallng": None,
+        "departuredate": None,
+        "arrivaldate": None,
+        "scheduleid": str(uuid.uuid4()),  # Unique schedule ID
+        "status": "available",  # Can be: Available, In Transit, Completed
+        "lastupdated": str(datetime.utcnow()),
+        "role": "Freighter"
+    }
 
-# 11 Suppliers (Clients)
-SUPPLIERS = [
-    {
+def make_supplier(name, email):
+    return {
         "userid": uuid.uuid4(),
-        "name": f"Supplier {i+1}",
-        "email": f"supplier{i+1}@test.com",
+        "name": name,
+        "email": email,
         "password": "securepass123",
         "role": "Supplier"
     }
-    for i in range(11)
-]
+
+FREIGHTERS = [make_freighter(f"Freighter {i+1}", f"freighter{i+1}@test.com") for i in range(20)]
+
+# 11 Suppliers (Clients)
+SUPPLIERS = [make_supplier(f"Supplier {i+1}", f"supplier{i+1}@test.com") for i in range(11)]
 
 # Track active user sessions
 ACTIVE_SESSIONS = {}  # {userid: expiration_time}
 
+user_slots = asyncio.Semaphore(MAX_CONCURRENT_USERS)
+
+
+def create_client_session():
+    """The simulator's HTTP client; create one and share it between all tasks."""
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT))
+
 
 async def get_access_token(session, email, password, name, role):
     login_url = f"{BASE_URL}/users/login"
@@ -97,16 +124,16 @@ async def get_access_token(session, email, password, name, role):
     async with session.post(login_url, json={"name": name, "email": email, "password": password}) as resp:
         if resp.status == 200:
             data = await resp.json()
-            print(f"✅ Logged in: {name}")
+            log.debug("logged in", user=name)
             return data["userid"], data["name"], data["email"], data["role"]
 
     async with session.post(register_url, json={"name": name, "email": email, "password": password, "role": role}) as resp:
         if resp.status == 200:
             data = await resp.json()
-            print(f"✅ Registered: {name}")
+            log.debug("registered", user=name)
             return data["userid"], data["name"], data["email"], data["role"]
 
-    print(f"❌ Registration failed for {name}: {await resp.text()}")
+    log.warning("registration failed", user=name, response=await resp.text())
     return None
 
 
@@ -115,19 +142,24 @@ async def simulate(session, user, resp):
     ACTIVE_SESSIONS[user["userid"]] = resp.cookies.get("fb_access_token").value
 
     if data['role'] == 'Supplier':
-        await generate_shipment(data)
+        await generate_shipment(session, data)
     elif data['role'] == 'Freighter':
-        await update_freighter_schedule(data)
+        await update_freighter_schedule(session, data)
 
 
 async def handle_user_session(session, user):
     await asyncio.sleep(random.randint(int(DAY_LENGTH / 10), DAY_LENGTH))  # Random start time in the "day"   
 
+    async with user_slots:
+        await run_user_session(session, user)
+
+
+async def run_user_session(session, user):
     async with session.post(f"{BASE_URL}/users/login", json={
         "name": user["name"], "email": user["email"], "password": user["password"]
     }) as resp:
         if resp.status == 200:
-            print(f"🔓 {user['name']} logged in.")
+            log.debug("logged in", user=user["name"])
             await simulate(session, user, resp)
             await logout(session, user)
         else:
@@ -135,7 +167,7 @@ async def handle_user_session(session, user):
                 "userid": str(user["userid"]), "name": user["name"], "email": user["email"], "password": user["password"], "role": user["role"]
             }) as resp:
                 if resp.status == 200:
-                    print(f"🔓 {user['name']} registered.")
+                    log.debug("registered", user=user["name"])
                     await simulate(session, user, resp)
                     await logout(session, user)
 
@@ -146,85 +178,91 @@ async def logout(session, user):
 
         async with session.post(f"{BASE_URL}/users/logout", headers=headers) as logout_resp:
             if logout_resp.status == 200:
-                print(f"🔒 {user['name']} logged out.")
+                log.debug("logged out", user=user["name"])
                 del ACTIVE_SESSIONS[user["userid"]]
             else:
-                print(f"⚠️ Logout failed for {user['name']}: {await logout_resp.text()}")
+                log.warning("logout failed", user=user["name"], response=await logout_resp.text())
     except aiohttp.ClientError as e:
-        print(f"⚠️ Server error during logout ({user['name']}): {e}")
+        log.warning("server error during logout", user=user["name"], error=e)
 
 async def manage_sessions():
-    async with aiohttp.ClientSession() as session:
+    async with create_client_session() as session:
+        # Read the response so its connection goes back to the pool
         async with session.post(f"{BASE_URL}/users/register", json=ADMIN) as resp:
-            day = 1
-            while True:
-                start_time = time.monotonic()  # Start time for this day
-                try:
-                    print(f"\n⏳ Day {day} starting...")
-                    users = FREIGHTERS + SUPPLIERS
-                    random.shuffle(users)
+            await resp.read()
+
+        day = 1
+        while True:
+            start_time = time.monotonic()  # Start time for this day
+            try:
+                log.info("day starting", day=day)
+                users = FREIGHTERS + SUPPLIERS
+                random.shuffle(users)
 
-                    tasks = [asyncio.create_task(handle_user_session(session, user)) for user in users]
-                    await asyncio.gather(*tasks)
+                tasks = [asyncio.create_task(handle_user_session(session, user)) for user in users]
+                await asyncio.gather(*tasks)
 
-                    print(f"\n🔄 Day {day} complete. Waiting for next cycle...\n")
-                    day += 1
+                log.info("day complete", day=day)
+                day += 1
 
-                except Exception as e:
-                    print(f"❌ ERROR in manage_sessions() on Day {day}: {e}")
-                    traceback.print_exc()
+            except Exception:
+                log.exception("manage_sessions failed", day=day)
 
-                # Calculate how long the processing took and sleep for the remainder of the day.
-                elapsed = time.monotonic() - start_time
-                sleep_time = DAY_LENGTH - elapsed
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
+            # Calculate how long the processing took and sleep for the remainder of the day.
+            elapsed = time.monotonic() - start_time
+            sleep_time = DAY_LENGTH - elapsed
+            if sleep_time > 0:
+                await asyncio.sleep(sleep_time)
 
 
-async def generate_shipment(supplier):
+def random_shipment(clientid):
+    """A pending shipment request between two random cities."""
     origin_city = random.choice(CITIES)
     destination_city = random.choice([city for city in CITIES if city != origin_city])
-    weight_kg = random.randint(500, 5000)
-
-    print(f"📦 {supplier['name']} shipping {weight_kg}kg {origin_city} → {destination_city}")
-
-    shipment_data = {
-        "clientid": supplier["userid"],
+    return {
+        "clientid": clientid,
         "origincity": origin_city[0],
         "originlat": origin_city[1],
         "originlng": origin_city[2],
         "destinationcity": destination_city[0],
         "destinationlat": destination_city[1],
         "destinationlng": destination_city[2],
-        "weightkg": weight_kg,
+        "weightkg": random.randint(500, 5000),
         "specialhandling": None,
         "status": "pending"
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{BASE_URL}/shipments/requests", json=shipment_data) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                if data:
-                    print(f"📦 Shipment created: {supplier['name']}")
-            else:
-                print(f"❌ Failed shipment {supplier['name']}: {await resp.text()}")
 
+async def generate_shipment(session, supplier):
+    shipment_data = random_shipment(supplier["userid"])
+
+    log.debug(
+        "shipping", user=supplier["name"], weightkg=shipment_data["weightkg"],
+        origin=shipment_data["origincity"], destination=shipment_data["destinationcity"]
+    )
 
-async def update_freighter_schedule(user):
+    async with session.post(f"{BASE_URL}/shipments/requests", json=shipment_data) as resp:
+        if resp.status == 200:
+            data = await resp.json()
+            if data:
+                log.debug("shipment created", user=supplier["name"])
+        else:
+            log.warning("failed shipment", user=supplier["name"], response=await resp.text())
+
+
+async def update_freighter_schedule(session, user):
     freighter = None
     for f in FREIGHTERS:
         if f["userid"] == user["userid"]:
             freighter = f
     if freighter:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{BASE_URL}/freighters/schedules", json=freighter) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data:
-                        print(f"🕒 Schedule Updated: {freighter['name']}")
-                else:
-                    print(f"❌ Failed schedule update {freighter['name']}: {await resp.text()}")
+        async with session.post(f"{BASE_URL}/freighters/schedules", json=freighter) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                if data:
+                    log.debug("schedule updated", user=freighter["name"])
+            else:
+                log.warning("failed schedule update", user=freighter["name"], response=await resp.text())
     else:
         raise Exception("failed freighter user id match...")
 
@@ -244,15 +282,14 @@ def haversine(lat1, lng1, lat2, lng2):
 
 import asyncio
 import aiohttp
-from datetime import datetime
 
 async def move_freighters_toward_destination():
-    async with aiohttp.ClientSession() as session:
+    async with create_client_session() as session:
         while True:
             # Retrieve all freighter schedules
             async with session.get(f"{BASE_URL}/freighters/schedules") as resp:
                 if resp.status != 200:
-                    print("Failed to get freighter schedules")
+                    log.warning("failed to get freighter schedules", status=resp.status)
                     await asyncio.sleep(1)
                     continue
                 schedules = await resp.json()
@@ -260,10 +297,14 @@ async def move_freighters_toward_destination():
             # Retrieve all shipment matches (to track which shipment is in which freighter)
             async with session.get(f"{BASE_URL}/shipments/matches") as resp:
                 if resp.status != 200:
-                    print("Failed to get shipment matches")
+                    log.warning("failed to get shipment matches", status=resp.status)
                     await asyncio.sleep(1)
                     continue
                 matches = await resp.json()
+
+            # Index matches by scheduleid once per tick instead of scanning them per schedule
+            fleet = FleetState()
+            fleet.replace_matches(matches)
             
             # Process each freighter that is "In Transit"
             for schedule in schedules:
@@ -273,14 +314,14 @@ async def move_freighters_toward_destination():
                     continue
 
                 # Get the shipment associated with this freighter
-                match = next((m for m in matches if m["scheduleid"] == schedule["scheduleid"]), None)
+                match = fleet.match_for_schedule(schedule["scheduleid"])
                 if not match:
                     continue  # Skip if no shipment match is found
 
                 # Retrieve shipment details
                 async with session.get(f"{BASE_URL}/shipments/requests?request_id={match['requestid']}") as shipment_resp:
                     if shipment_resp.status != 200:
-                        print(f"Failed to get shipment request for {match['requestid']}")
+                        log.warning("failed to get shipment request", requestid=match["requestid"])
                         continue
                     shipment = await shipment_resp.json()
 
@@ -291,7 +332,6 @@ async def move_freighters_toward_destination():
                 dest_lng = float(schedule["arrivallng"])
 
                 distance_remaining = haversine(current_lat, current_lng, dest_lat, dest_lng)
-                print("\nDISTANCE REMAINING\n", distance_remaining, "\n")
 
                 if distance_remaining <= SPEED_KM_PER_TICK:
                     # Freighter reaches its destination
@@ -306,7 +346,7 @@ async def move_freighters_toward_destination():
                     new_status = "in transit"
                     shipment_status = "pending"
 
-                print("\nFractional movement\n", fraction, "\n")
+                log.debug("moving freighter", scheduleid=schedule["scheduleid"], distance_remaining=distance_remaining)
 
                 # Update freighter schedule
                 updated_schedule = schedule.copy()
@@ -314,13 +354,15 @@ async def move_freighters_toward_destination():
                 updated_schedule["departurelng"] = float(new_lng)
                 updated_schedule["status"] = new_status
                 updated_schedule["lastupdated"] = str(datetime.utcnow())
+                # Don't overwrite a schedule the matcher changed since we read it (409 instead)
+                updated_schedule["expected_lastupdated"] = schedule["lastupdated"]
 
                 async with session.post(f"{BASE_URL}/freighters/schedules", json=updated_schedule) as update_resp:
                     if update_resp.status == 200:
-                        print(f"Updated schedule {schedule['scheduleid']} to status {new_status}")
+                        log.debug("updated schedule", scheduleid=schedule["scheduleid"], status=new_status)
                     else:
                         error_text = await update_resp.text()
-                        print(f"Failed to update schedule {schedule['scheduleid']}: {error_text}")
+                        log.warning("failed to update schedule", scheduleid=schedule["scheduleid"], response=error_text)
 
                 # Update shipment position (origin moves as the truck moves)
 
@@ -330,12 +372,135 @@ async def move_freighters_toward_destination():
                 updated_shipment["originlng"] = float(new_lng)
                 updated_shipment["status"] = shipment_status
                 updated_shipment["lastupdated"] = str(datetime.utcnow())
+                updated_shipment["expected_lastupdated"] = shipment[0]["lastupdated"]
 
                 async with session.post(f"{BASE_URL}/shipments/requests", json=updated_shipment) as update_resp:
                     if update_resp.status == 200:
-                        print(f"Updated shipment {updated_shipment['requestid']} to status {shipment_status}")
+                        log.debug("updated shipment", requestid=updated_shipment["requestid"], status=shipment_status)
                     else:
                         error_text = await update_resp.text()
-                        print(f"Failed to update shipment {updated_shipment['requestid']}: {error_text}")
+                        log.warning("failed to update shipment", requestid=updated_shipment["requestid"], response=error_text)
 
             await asyncio.sleep(0.5)
+
+
+# ==============================
+# Native (server-side) movement
+# ==============================
+#
+# Advances every in-transit freighter in one vectorized step and persists the
+# tick with a single UPDATE per table, instead of 2 + 3N HTTP calls.
+
+SIMULATION_MODE = env.get("simulation", {}).get("mode", "native")  # "native" or "http"
+TICK_INTERVAL = env.get("simulation", {}).get("tick_interval", 0.5)
+
+IN_TRANSIT_SCHEDULES = """
+    SELECT f.scheduleid, f.departurelat, f.departurelng, f.arrivallat, f.arrivallng, f.lastupdated
+    FROM freighterschedules f
+    WHERE f.status = 'in transit'
+      AND f.arrivallat IS NOT NULL AND f.arrivallng IS NOT NULL
+      AND EXISTS (SELECT 1 FROM shipmentmatches m WHERE m.scheduleid = f.scheduleid)
+"""
+
+# Compare-and-swap on lastupdated: a schedule written by someone else since it
+# was read is left alone this tick and picked up again by the next one.
+MOVE_SCHEDULES = """
+    UPDATE freighterschedules AS f
+    SET departurelat = u.lat, departurelng = u.lng, status = u.status, lastupdated = bump_last_updated(f.lastupdated)
+    FROM unnest($1::uuid[], $2::float8[], $3::float8[], $4::varchar[], $5::timestamp[]) AS u(scheduleid, lat, lng, status, lastupdated)
+    WHERE f.scheduleid = u.scheduleid AND f.lastupdated = u.lastupdated
+    RETURNING f.scheduleid, f.departurelat, f.departurelng, f.status, f.lastupdated
+"""
+
+# Shipments ride along with the truck they were matched to
+MOVE_SHIPMENTS = """
+    UPDATE shipmentrequests AS r
+    SET originlat = u.lat, originlng = u.lng, status = u.status, lastupdated = bump_last_updated(r.lastupdated)
+    FROM shipmentmatches m
+    JOIN unnest($1::uuid[], $2::float8[], $3::float8[], $4::varchar[]) AS u(scheduleid, lat, lng, status)
+      ON m.scheduleid = u.scheduleid
+    WHERE r.requestid = m.requestid AND r.status = 'matched'
+    RETURNING r.requestid, r.originlat, r.originlng, r.status, r.lastupdated
+"""
+
+def advance_positions(lats, lngs, dest_lats, dest_lngs, step_km=SPEED_KM_PER_TICK):
+    """
+    Move each point step_km toward its destination (linear interpolation in
+    lat/lng, like the per-truck loop). Returns (new_lats, new_lngs, arrived).
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    dest_lats = np.asarray(dest_lats, dtype=np.float64)
+    dest_lngs = np.asarray(dest_lngs, dtype=np.float64)
+
+    distance_remaining = haversine_pairwise(lats, lngs, dest_lats, dest_lngs)
+    arrived = distance_remaining <= step_km
+
+    fraction = step_km / np.where(arrived, 1.0, distance_remaining)
+    new_lats = np.where(arrived, dest_lats, lats + fraction * (dest_lats - lats))
+    new_lngs = np.where(arrived, dest_lngs, lngs + fraction * (dest_lngs - lngs))
+    return new_lats, new_lngs, arrived
+
+async def simulation_tick(conn):
+    """
+    Advance all in-transit freighters once. Returns the moved (schedules,
+    shipments) as records holding only the id, position, status and
+    lastupdated.
+    """
+    rows = await conn.fetch(IN_TRANSIT_SCHEDULES)
+    if not rows:
+        return [], []
+
+    new_lats, new_lngs, arrived = advance_positions(
+        [r["departurelat"] for r in rows],
+        [r["departurelng"] for r in rows],
+        [r["arrivallat"] for r in rows],
+        [r["arrivallng"] for r in rows]
+    )
+
+    scheduleids = [r["scheduleid"] for r in rows]
+    new_lats = new_lats.tolist()
+    new_lngs = new_lngs.tolist()
+
+    async with conn.transaction():
+        schedules = await conn.fetch(
+            MOVE_SCHEDULES, scheduleids, new_lats, new_lngs,
+            np.where(arrived, "completed", "in transit").tolist(),
+            [r["lastupdated"] for r in rows]
+        )
+
+        # Only the trucks that actually moved carry their shipments along
+        moved = {s["scheduleid"] for s in schedules}
+        keep = [i for i, scheduleid in enumerate(scheduleids) if scheduleid in moved]
+        shipment_status = np.where(arrived, "completed", "matched").tolist()
+
+        shipments = await conn.fetch(
+            MOVE_SHIPMENTS,
+            [scheduleids[i] for i in keep], [new_lats[i] for i in keep], [new_lngs[i] for i in keep],
+            [shipment_status[i] for i in keep]
+        )
+
+    return schedules, shipments
+
+async def native_simulation_tick(on_tick=None):
+    """Run one simulation tick and await on_tick, if given, with the records it updated so they can be broadcast."""
+    async with acquire_db() as conn:
+        schedules, shipments = await simulation_tick(conn)
+
+    if on_tick and (schedules or shipments):
+        await on_tick(schedules, shipments)
+
+def simulation_job(on_tick=None):
+    """
+    Scheduler job moving the freighters: native ticks, or the HTTP loop,
+    restarted if it fails.
+
+    Native ticks are fixed-delay: each one waits TICK_INTERVAL after the
+    previous one finished. Every tick moves a truck by the same distance, so
+    with tens of thousands of trucks in transit (where a tick takes about as
+    long as TICK_INTERVAL) simulated time runs slower than the clock, rather
+    than the job overrunning and skipping every other tick.
+    """
+    if SIMULATION_MODE == "native":
+        return Job("simulation", lambda: native_simulation_tick(on_tick), interval=TICK_INTERVAL)
+    return Job("simulation", move_freighters_toward_destination)
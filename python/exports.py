@@ -0,0 +1,74 @@
+import csv
+import io
+from datetime import timezone
+from fastapi import HTTPException
+from startup import acquire_db
+from serialization import dumps_text
+
+CURSOR_PREFETCH = 1000  # rows fetched from the server-side cursor per round trip
+ROWS_PER_CHUNK = 500  # rows encoded into each chunk of the streamed body
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def media_type(fmt):
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format {fmt}, expected one of {list(MEDIA_TYPES)}")
+    return MEDIA_TYPES[fmt]
+
+
+def export_query(table, since_column, id_column, since=None):
+    """
+    Rows written at or after since, ordered by (since_column, id_column) so
+    an export is reproducible and can be resumed from the last row's
+    since_column. since_column is a TIMESTAMP without time zone holding UTC;
+    an aware since is converted to that.
+    """
+    order = f" ORDER BY {since_column}, {id_column}"
+    if since is None:
+        return f"SELECT * FROM {table}{order}", []
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return f"SELECT * FROM {table} WHERE {since_column} >= $1{order}", [since]
+
+
+def _csv_value(value):
+    return "" if value is None else str(value)
+
+
+async def stream_rows(sql, args, fmt):
+    """
+    Yield the query's rows encoded as NDJSON or CSV, reading them through a
+    server-side cursor so memory stays constant however large the table is.
+    A CSV export starts with the header row, even when no rows match.
+    The pooled connection is held until the stream finishes.
+    """
+    async with acquire_db() as conn:
+        async with conn.transaction():
+            statement = await conn.prepare(sql)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if fmt == "csv" else None
+            buffered_rows = 0
+
+            if writer is not None:
+                writer.writerow([attribute.name for attribute in statement.get_attributes()])
+
+            async for record in statement.cursor(*args, prefetch=CURSOR_PREFETCH):
+                if writer is not None:
+                    writer.writerow([_csv_value(v) for v in record.values()])
+                else:
+                    buffer.write(dumps_text(record))
+                    buffer.write("\n")
+
+                buffered_rows += 1
+                if buffered_rows >= ROWS_PER_CHUNK:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                    buffered_rows = 0
+
+            if buffer.tell():
+                yield buffer.getvalue()
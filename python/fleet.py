@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+
+class FleetState:
+    """
+    In-memory view of schedules, shipments and matches with O(1) indexes:
+
+        scheduleid -> schedule, requestid -> shipment,
+        scheduleid -> match, requestid -> match,
+        status -> ids (insertion ordered, so candidate order is stable)
+
+    Rows are plain mappings and are kept as given; every upsert/remove keeps
+    the indexes in step, so callers can apply deltas instead of reloading.
+    """
+
+    def __init__(self):
+        self.schedules = {}
+        self.shipments = {}
+        self.matches = {}
+        self.schedule_ids_by_status = defaultdict(dict)  # status -> {scheduleid: None}
+        self.request_ids_by_status = defaultdict(dict)  # status -> {requestid: None}
+        self.match_by_schedule = {}
+        self.match_by_request = {}
+
+    def clear(self):
+        self.__init__()
+
+    # Schedules
+
+    def upsert_schedule(self, row):
+        scheduleid = str(row["scheduleid"])
+        previous = self.schedules.get(scheduleid)
+        if previous is not None and previous["status"] != row["status"]:
+            self.schedule_ids_by_status[previous["status"]].pop(scheduleid, None)
+
+        self.schedules[scheduleid] = row
+        self.schedule_ids_by_status[row["status"]][scheduleid] = None
+
+    def remove_schedule(self, scheduleid):
+        scheduleid = str(scheduleid)
+        previous = self.schedules.pop(scheduleid, None)
+        if previous is not None:
+            self.schedule_ids_by_status[previous["status"]].pop(scheduleid, None)
+
+    def schedules_with_status(self, status):
+        return [self.schedules[scheduleid] for scheduleid in self.schedule_ids_by_status.get(status, ())]
+
+    # Shipments
+
+    def upsert_shipment(self, row):
+        requestid = str(row["requestid"])
+        previous = self.shipments.get(requestid)
+        if previous is not None and previous["status"] != row["status"]:
+            self.request_ids_by_status[previous["status"]].pop(requestid, None)
+
+        self.shipments[requestid] = row
+        self.request_ids_by_status[row["status"]][requestid] = None
+
+    def remove_shipment(self, requestid):
+        requestid = str(requestid)
+        previous = self.shipments.pop(requestid, None)
+        if previous is not None:
+            self.request_ids_by_status[previous["status"]].pop(requestid, None)
+
+    def shipments_with_status(self, status):
+        return [self.shipments[requestid] for requestid in self.request_ids_by_status.get(status, ())]
+
+    # Matches
+
+    def add_match(self, row):
+        """
+        Index a match. A schedule carrying several shipments keeps its first
+        match, the same one a linear search over the match list would find.
+        """
+        self.matches[str(row["matchid"])] = row
+        self.match_by_schedule.setdefault(str(row["scheduleid"]), row)
+        self.match_by_request.setdefault(str(row["requestid"]), row)
+
+    def replace_matches(self, rows):
+        self.matches = {}
+        self.match_by_schedule = {}
+        self.match_by_request = {}
+        for row in rows:
+            self.add_match(row)
+
+    def match_for_schedule(self, scheduleid):
+        return self.match_by_schedule.get(str(scheduleid))
+
+    def match_for_request(self, requestid):
+        return self.match_by_request.get(str(requestid))
+
+    def counts(self):
+        return {
+            "schedules": {status: len(ids) for status, ids in self.schedule_ids_by_status.items() if ids},
+            "shipments": {status: len(ids) for status, ids in self.request_ids_by_status.items() if ids},
+            "matches": len(self.matches)
+        }
@@ -1,41 +1,87 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, Security, Query
 from contextlib import asynccontextmanager
-import bcrypt
 import jwt
 import uuid
 from datetime import datetime, timedelta
-import json
 import asyncio
+import os
 from typing import Annotated, Optional
 
-from models import User, UserRegister, FreighterSchedules, ShipmentRequests, ShipmentMatches
-from security import create_jwt_token, verify_token, verify_role, hash_password, verify_admin
-from startup import connect_db, load_stored_procedures
-from data.simulation import manage_sessions, move_freighters_toward_destination
+from models import User, UserRegister, ShipmentMatches
+from security import create_jwt_token, verify_token, require_role, hash_password_async, check_password_async, verify_admin, token_cache, password_pool
+from startup import load_stored_procedures, create_db_pool, close_db_pool, acquire_db, db_pool_stats, env
+from data.simulation import manage_sessions, simulation_job
 from fastapi.middleware.cors import CORSMiddleware
-from service import match_freighters_to_shipments_async
+from fastapi.responses import StreamingResponse
+from broadcast import BroadcastHub
+from sessions import create_session_store
+from cluster import CLUSTER_ENABLED, LeaderElection, EventRelay
+from pagination import page_query, next_cursor, parse_bbox, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from exports import export_query, stream_rows, media_type
+from serialization import (
+    RecordResponse, dumps_text, loads, schedule_payload, shipment_payload, match_payload, position_payload
+)
+from statements import (
+    get_user_by_name, insert_user, insert_user_with_id, get_all_freighter_schedules,
+    upsert_freighter_schedule, upsert_shipment_request, statement_stats
+)
+from service import matcher_jobs, notify_schedule_change, notify_shipment_change
+from scheduler import Job, JobScheduler, FIXED_RATE
+from logs import get_logger
+from metrics import (
+    MetricsMiddleware, monitor_event_loop_lag, metrics_snapshot, metrics_update, render_prometheus, PROMETHEUS_CONTENT_TYPE
+)
 
+log = get_logger("api")
+log.info('Python Backend API for "Freight Broker" application')
 
-print('Python Backend API for "Freight Broker" application')
+hub = BroadcastHub()
+session_store = create_session_store()
 
-active_connections = set()
-active_users = set()
+# Background jobs (sessions, matcher, simulation, match broadcast) run in the
+# leader only; worker jobs run in every worker. Both are registered below,
+# once the handlers they call are defined.
+background_jobs = JobScheduler()
+worker_jobs = JobScheduler()
+
+def start_background_tasks():
+    return background_jobs.start()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Every worker samples its own event loop and streams its own metrics
+    metrics_tasks = [asyncio.create_task(monitor_event_loop_lag()), *worker_jobs.start()]
+
+    if CLUSTER_ENABLED:
+        # Schemas are loaded once by `python startup.py` before the workers start;
+        # only the elected leader runs the background tasks.
+        await create_db_pool()
+        relay.start()
+        leader.start()
+
+        yield
+
+        await leader.stop()
+        await relay.stop()
+        await close_db_pool()
+        for task in metrics_tasks:
+            task.cancel()
+        return
+
     await load_stored_procedures()
 
-    print("LOADED STORED PROCEDURES")
+    log.info("loaded stored procedures")
+
+    await create_db_pool()
 
-    # Start the session management task (runs forever)
-    loop = asyncio.get_event_loop()
-    loop.create_task(manage_sessions())
-    loop.create_task(match_freighters_to_shipments_async())
-    loop.create_task(move_freighters_toward_destination())
-    loop.create_task(send_match_updates())
+    start_background_tasks()
 
     yield  # FastAPI continues running while this task runs in the background
 
+    await background_jobs.stop()
+    await close_db_pool()
+    for task in metrics_tasks:
+        task.cancel()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -45,6 +91,8 @@ origins = [
     "https://your-production-domain.com",  # Add your deployed frontend domain
 ]
 
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,  # Allow specific frontend domains
@@ -56,91 +104,194 @@ app.add_middleware(
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    active_connections.add(websocket)
+    hub.register(websocket)
     # print("Client connected!")
 
     try:
+        await send_snapshot(websocket)
+
         while True:
             data = await websocket.receive_text()
             # print(f"Received: {data}")
 
-            message = json.loads(json)
+            # A malformed frame is skipped, not allowed to end the connection
+            try:
+                message = loads(data)
+            except ValueError:
+                log.debug("ignoring malformed websocket frame", size=len(data))
+                continue
+            if not isinstance(message, dict):
+                log.debug("ignoring websocket frame that is not an object", size=len(data))
+                continue
 
+            # Clients that notice a gap in broadcast versions ask for a fresh snapshot
+            if message.get("type") == "resync":
+                await send_snapshot(websocket)
+                continue
 
-            for connection in active_connections:
-                await connection.send_text(json.dumps(message))
+            await broadcast(message)
 
     except WebSocketDisconnect:
         # print("Client disconnected!")
-        active_connections.remove(websocket)
+        pass
+    finally:
+        hub.unregister(websocket)
+
+# ==============================
+# Broadcast protocol
+# ==============================
+#
+# Writes broadcast only the rows they touched ("freighter_update",
+# "shipment_update", "match_update"), each stamped with a monotonically
+# increasing version. Simulation ticks broadcast only positions
+# ("freighter_moved", "shipment_moved"), versioned the same way. A client gets
+# a full "snapshot" on connect and whenever it sends { "type": "resync" } after
+# seeing a version gap.
+
+broadcast_version = 0
+
+def next_broadcast_version():
+    global broadcast_version
+    broadcast_version += 1
+    return broadcast_version
+
+async def send_snapshot(websocket):
+    # Read before the tables: deltas broadcast while they are being read carry
+    # later versions, and the client replays those on top of the snapshot.
+    version = broadcast_version
+
+    async with acquire_db() as conn:
+        schedules = await conn.fetch("SELECT * FROM freighterschedules")
+        requests = await conn.fetch("SELECT * FROM shipmentrequests")
+        matches = await conn.fetch("SELECT * FROM shipmentmatches")
+
+    hub.send(websocket, dumps_text({
+        "type": "snapshot",
+        "version": version,
+        "payload": {
+            "freighters": [schedule_payload(s) for s in schedules],
+            "shipments": [shipment_payload(s) for s in requests],
+            "matches": [match_payload(m) for m in matches]
+        }
+    }), droppable=False)
+
+VERSIONED_MESSAGES = {"freighter_update", "shipment_update", "match_update", "freighter_moved", "shipment_moved"}
+
+def deliver(message):
+    """Fan a message out to this worker's sockets, stamping table updates with the next version."""
+    if message.get("type") in VERSIONED_MESSAGES:
+        message["version"] = next_broadcast_version()
+    hub.publish(message)
+
+async def broadcast(message):
+    if CLUSTER_ENABLED:
+        await relay.publish({"kind": "broadcast", "message": message})
+    else:
+        deliver(message)
+
+async def publish_change(kind, row):
+    """Hand a written schedule/shipment row to the matcher, wherever it is running."""
+    if CLUSTER_ENABLED:
+        await relay.publish({"kind": kind, "row": dict(row)})
+    elif kind == "schedule":
+        notify_schedule_change(row)
+    else:
+        notify_shipment_change(row)
+
+def handle_cluster_event(event):
+    kind = event.get("kind")
+    if kind == "broadcast":
+        deliver(event["message"])
+    elif kind == "schedule" and leader.is_leader:
+        notify_schedule_change(event["row"])
+    elif kind == "shipment" and leader.is_leader:
+        notify_shipment_change(event["row"])
+
+def handle_cluster_reconnect():
+    # Events may have been missed; burning a version makes every client resync
+    next_broadcast_version()
+
+relay = EventRelay(handle_cluster_event, on_reconnect=handle_cluster_reconnect)
+leader = LeaderElection(start_background_tasks)
 
 async def alert_user_connect(user, which):
     if which == 'login':
-        active_users.add(user)
-    elif user in active_users:
-        active_users.remove(user)
+        await session_store.add_active_user(user)
+    else:
+        await session_store.remove_active_user(user.userid)
 
-    message = json.dumps({ "type": "user_" + which, "payload": user.dict() })
-    for connection in active_connections:
-        try:
-            await connection.send_text(message)
-        except Exception as e:
-            print(f"Failed to send message {e}")
+    await broadcast({ "type": "user_" + which, "payload": user.dict() })
 
 
 async def alert_shipment(shipments):
-    shipments = [
-        {
-            **s.dict(),
-            "createdat": str(s.createdat),
-            "lastupdated": str(s.lastupdated),
-        }
-        for s in shipments
-    ]
+    shipments = [shipment_payload(s) for s in shipments]
 
-    message = json.dumps({ "type": "shipment_update", "payload": shipments })
-    for connection in active_connections:
-        try:
-            await connection.send_text(message)
-        except Exception as e:
-            print(f"Failed to send message {e}")
+    await broadcast({ "type": "shipment_update", "payload": shipments })
 
 async def alert_schedule(schedules):
-    schedules = [
-        {
-            **s.dict(),
-            "departurelat": float(s.departurelat),
-            "departurelng": float(s.departurelng),
-            "arrivallat": float(s.arrivallat) if s.arrivallat else "",
-            "arrivallng": float(s.arrivallng) if s.arrivallng else "",
-            "maxloadkg": float(s.maxloadkg),
-            "availablekg": float(s.availablekg)
-        }
-        for s in schedules
-    ]
-    message = json.dumps({ "type": "freighter_update", "payload": schedules })
-    for connection in active_connections:
-        try:
-            await connection.send_text(message)
-        except Exception as e:
-            print(f"Failed to send message {e}")
+    schedules = [schedule_payload(s) for s in schedules]
+
+    await broadcast({ "type": "freighter_update", "payload": schedules })
 
 async def alert_matches(matches):
-    matches = list(map(lambda s: s.dict(), matches))
-    message = json.dumps({ "type": "match_update", "payload": matches })
-    for connection in active_connections:
-        try:
-            await connection.send_text(message)
-        except Exception as e:
-            print(f"Failed to send message {e}")
+    matches = [match_payload(m) for m in matches]
+
+    await broadcast({ "type": "match_update", "payload": matches })
+
+async def alert_matched(matched):
+    """Broadcast the schedules, shipments and match rows written by a matcher pass."""
+    scheduleids = [uuid.UUID(scheduleid) for scheduleid, _ in matched]
+    requestids = [uuid.UUID(requestid) for _, requestid in matched]
+
+    async with acquire_db() as conn:
+        schedules = await conn.fetch("SELECT * FROM freighterschedules WHERE scheduleid = ANY($1::uuid[])", scheduleids)
+        requests = await conn.fetch("SELECT * FROM shipmentrequests WHERE requestid = ANY($1::uuid[])", requestids)
+        matches = await conn.fetch("SELECT * FROM shipmentmatches WHERE requestid = ANY($1::uuid[])", requestids)
+
+    await alert_schedule(schedules)
+    await alert_shipment(requests)
+    await alert_matches(matches)
+
+async def alert_moved(schedules, shipments):
+    """
+    Broadcast the positions moved by a native simulation tick. Clients patch
+    these fields into the rows they already have.
+    """
+    if schedules:
+        await broadcast({
+            "type": "freighter_moved",
+            "payload": [position_payload(s, "scheduleid", "departurelat", "departurelng") for s in schedules]
+        })
+    if shipments:
+        await broadcast({
+            "type": "shipment_moved",
+            "payload": [position_payload(s, "requestid", "originlat", "originlng") for s in shipments]
+        })
+
+METRICS_UPDATE_INTERVAL = env.get("metrics", {}).get("update_interval", 2)  # seconds between metrics_update messages
+
+async def send_metrics_update():
+    """Push this worker's rolling-window metrics to its WebSocket clients."""
+    hub.publish({
+        "type": "metrics_update",
+        "payload": {**metrics_update({"websocket_clients": len(hub)}), "worker": os.getpid()}
+    })
 
 async def send_match_updates():
-    conn = await connect_db()
-    matches = await conn.fetch("SELECT * FROM get_shipment_matches()")
-    await conn.close()
+    async with acquire_db() as conn:
+        matches = await conn.fetch("SELECT * FROM shipmentmatches")
     await alert_matches(matches)
 
-register_tokens = dict()
+background_jobs.add(Job("sessions", manage_sessions))
+for job in matcher_jobs(on_matched=alert_matched):
+    background_jobs.add(job)
+background_jobs.add(simulation_job(on_tick=alert_moved))
+background_jobs.add(Job("match-broadcast", send_match_updates))
+
+# Skipped while no client is connected
+worker_jobs.add(Job(
+    "metrics-updates", send_metrics_update, interval=METRICS_UPDATE_INTERVAL, mode=FIXED_RATE, backlog=lambda: len(hub)
+))
 
 @app.post("/users/register")
 async def register(request: Request, response: Response):
@@ -151,22 +302,22 @@ async def register(request: Request, response: Response):
     password = body["password"]
     role = body.get("role", "Client")
 
-    conn = await connect_db()
-
-    existing_user = await conn.fetch("SELECT * FROM get_user_by_name($1)", name)
+    async with acquire_db() as conn:
+        existing_user = await get_user_by_name(conn, name)
 
     if existing_user:
-        await conn.close()
         raise HTTPException(status_code=500, detail=f"User {name} already exists")
 
-    password_hash = hash_password(password)
+    # bcrypt takes a while; don't hold a pool connection for it
+    password_hash = await hash_password_async(password)
 
-    new_user = []
+    async with acquire_db() as conn:
+        new_user = []
 
-    if userid:
-        new_user = await conn.fetch("SELECT * FROM insert_user_with_id($1, $2, $3, $4, $5)", uuid.UUID(userid), name, email, password_hash, role)
-    else:
-        new_user = await conn.fetch("SELECT userid, name, role, email FROM insert_user($1, $2, $3, $4)", name, email, password_hash, role)
+        if userid:
+            new_user = await insert_user_with_id(conn, uuid.UUID(userid), name, email, password_hash, role)
+        else:
+            new_user = await insert_user(conn, name, email, password_hash, role)
 
     if (len(new_user) < 1):
         raise HTTPException(status_code=500, detail=f"Internal Server Error")
@@ -180,7 +331,7 @@ async def register(request: Request, response: Response):
         expires_delta=timedelta(minutes=30)
     )
 
-    register_tokens[uid] = access_token
+    await session_store.put_token(uid, access_token)
 
     response.set_cookie(
         key="fb_access_token",
@@ -191,8 +342,6 @@ async def register(request: Request, response: Response):
         max_age=30 * 60
     )
 
-    await conn.close()
-
     user = user = User(**{
         "userid": str(new_user["userid"]),
         "name": new_user["name"],
@@ -200,7 +349,7 @@ async def register(request: Request, response: Response):
         "role": new_user["role"]
     })
 
-    if user not in active_users:
+    if not await session_store.is_active(user.userid):
         await alert_user_connect(user, 'login')
 
     return {
@@ -216,24 +365,21 @@ async def login(request: Request, response: Response):
     name = body["name"]
     password = body["password"]
 
-    conn = await connect_db()
-
-    existing_user = await conn.fetch("SELECT * FROM get_user_by_name($1)", name)
+    async with acquire_db() as conn:
+        existing_user = await get_user_by_name(conn, name)
 
     if not existing_user:
-        await conn.close()
         raise HTTPException(status_code=400, detail=f"User {name} doesn't exist.")
 
     user_data = existing_user[0]
     stored_hashed_password = user_data["passwordhash"]
 
-    if not bcrypt.checkpw(password.encode(), stored_hashed_password.encode()):
-        await conn.close()
+    if not await check_password_async(password, stored_hashed_password):
         raise HTTPException(status_code=401, detail="Invalid password")
 
     uid = str(user_data["userid"])
 
-    access_token = register_tokens[uid] if uid in register_tokens else create_jwt_token(
+    access_token = await session_store.get_token(uid) or create_jwt_token(
         data={"userid": uid, "name": user_data["name"], "role": user_data["role"]},
         expires_delta=timedelta(minutes=30)
     )
@@ -247,10 +393,6 @@ async def login(request: Request, response: Response):
         max_age=30 * 60
     )
 
-    await conn.close()
-
-    
-
     connected_user = {
         "userid": str(user_data["userid"]),
         "name": user_data["name"],
@@ -260,26 +402,96 @@ async def login(request: Request, response: Response):
 
     user = User(**connected_user)
 
-    if user not in active_users:
+    if not await session_store.is_active(user.userid):
         await alert_user_connect(user, 'login')
 
     return connected_user
 
 @app.post("/users/logout")
-async def logout(request: Request):
-    user = verify_token(request)
-
+async def logout(user: dict = Depends(verify_token)):
     await alert_user_connect(User(**user), 'logout')
 
 @app.get("/secure-data-test")
-async def security_test(request: Request):
-    user = verify_role(request, "Admin")
+async def security_test(user: dict = Depends(require_role("Admin"))):
     return {"message": "Access granted to secure data"}
 
 @app.get("/active-users")
-def get_active_users(request: Request):
-    user = verify_role(request, "Admin")
-    return active_users
+async def get_active_users(user: dict = Depends(require_role("Admin"))):
+    return await session_store.active_users()
+
+@app.get("/auth/password-pool-stats")
+async def get_password_pool_stats(user: dict = Depends(require_role("Admin"))):
+    return password_pool.stats()
+
+@app.get("/auth/token-cache-stats")
+async def get_token_cache_stats(user: dict = Depends(require_role("Admin"))):
+    return token_cache.stats()
+
+@app.get("/ws/stats")
+async def get_ws_stats():
+    return hub.stats()
+
+@app.get("/cluster/status")
+async def get_cluster_status():
+    return {
+        "enabled": CLUSTER_ENABLED,
+        "leader": leader.is_leader if CLUSTER_ENABLED else True,
+        "events": relay.stats()
+    }
+
+@app.get("/scheduler/stats")
+async def get_scheduler_stats():
+    """Timing, overrun and failure counts of this worker's scheduled jobs."""
+    return {
+        "leader": leader.is_leader if CLUSTER_ENABLED else True,
+        "jobs": {**background_jobs.stats(), **worker_jobs.stats()}
+    }
+
+@app.get("/db/pool-stats")
+async def get_db_pool_stats():
+    return db_pool_stats()
+
+@app.get("/db/statement-stats")
+async def get_db_statement_stats():
+    return statement_stats()
+
+@app.get("/metrics")
+async def get_metrics(format: str = Query("prometheus", pattern="^(prometheus|json)$")):
+    """Route latency, DB time, event-loop lag and matcher stats for this worker."""
+    pool = db_pool_stats()
+    gauges = {
+        "db_pool_size": pool["size"],
+        "db_pool_in_use": pool["in_use"],
+        "db_pool_wait_max_seconds": pool["wait_max_ms"] / 1000,
+        "ws_clients": len(hub)
+    }
+
+    if format == "json":
+        return RecordResponse(metrics_snapshot(gauges))
+    return Response(render_prometheus(gauges), media_type=PROMETHEUS_CONTENT_TYPE)
+
+# ==============================
+# Optimistic concurrency
+# ==============================
+#
+# Writes may send "expected_lastupdated" (the lastupdated they last read). The
+# write only applies if the row still has it; otherwise the caller gets a 409
+# with the current value and should re-read before retrying.
+
+def parse_expected_lastupdated(body):
+    expected = body.get("expected_lastupdated")
+    if expected is None:
+        return None
+    try:
+        return datetime.fromisoformat(expected)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Invalid expected_lastupdated {expected}")
+
+def raise_conflict(what, rowid, current):
+    raise HTTPException(
+        status_code=409,
+        detail=f"{what} {rowid} was modified concurrently (lastupdated is now {current.isoformat() if current else None})"
+    )
 
 # ==============================
 # ✅ Freighter Schedules
@@ -289,139 +501,162 @@ def get_active_users(request: Request):
 @app.post("/freighters/schedules")
 async def post_freighter_schedule(request: Request):
     body = await request.json()
-    conn = await connect_db()
 
     departuredate = datetime.strptime(body["departuredate"], "%Y-%m-%d %H:%M:%S.%f") if body["departuredate"] else None
     arrivaldate = datetime.strptime(body["arrivaldate"], "%Y-%m-%d %H:%M:%S.%f") if body["arrivaldate"] else None
-    freighterid = body["freighterid"]
-    departurelat = body["departurelat"]
-    departurelng = body["departurelng"]
-
-    current_departure = await conn.fetch(
-        """
-            SELECT departurelat, departurelng
-            FROM freighterschedules
-            WHERE freighterid = $1
-        """,
-        freighterid
-    )
+    expected_lastupdated = parse_expected_lastupdated(body)
 
-    if not len(current_departure):
-        current_departure = None
-    else:
-        current_departure = current_departure[0]
-
-    if not current_departure or float(current_departure["departurelat"]) != departurelat or float(current_departure["departurelng"]) != departurelng:
-
-        has_schedule = await conn.fetch("SELECT 1 FROM freighterschedules WHERE freighterid = $1", body["freighterid"])
-
-        new_schedule = await conn.fetch(
-            "SELECT * FROM " + ("insert" if len(has_schedule) == 0 else "update") + "_freighter_schedule($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)",
-            body["freighterid"], body["departurecity"], body["departurelat"], body["departurelng"],
+    async with acquire_db() as conn:
+        # Inserts, or updates the freighter's schedule; returns no row when the departure point is unchanged
+        # or the row no longer has expected_lastupdated
+        new_schedule = await upsert_freighter_schedule(
+            conn, body["freighterid"], body["departurecity"], body["departurelat"], body["departurelng"],
             body["arrivalcity"], body["arrivallat"], body["arrivallng"],
-            departuredate, arrivaldate, body["maxloadkg"], body["availablekg"], body["status"]
+            departuredate, arrivaldate, body["maxloadkg"], body["availablekg"], body["status"],
+            expected_lastupdated
         )
 
+        if not new_schedule and expected_lastupdated is not None:
+            current = await conn.fetchval("SELECT lastupdated FROM freighterschedules WHERE freighterid = $1", uuid.UUID(body["freighterid"]))
+            if current != expected_lastupdated:
+                raise_conflict("Freighter schedule", body["freighterid"], current)
 
-        schedules = await conn.fetch("""SELECT * FROM freighterschedules""")
+    if not new_schedule:
+        return None
 
-        await conn.close()
+    await publish_change("schedule", new_schedule[0])
 
-        await alert_schedule([
-            FreighterSchedules(**{
-                "scheduleid": str(s["scheduleid"]),
-                "freighterid": str(s["freighterid"]),
-                "departurecity": s["departurecity"],
-                "departurelat": float(s["departurelat"]),
-                "departurelng": float(s["departurelng"]),
-                "arrivalcity": s["arrivalcity"],
-                "arrivallat": s["arrivallat"],
-                "arrivallng": s["arrivallng"],
-                "departuredate": s["departuredate"],
-                "arrivaldate": s["arrivaldate"],
-                "maxloadkg": float(s["maxloadkg"]),
-                "availablekg": float(s["availablekg"]),
-                "status": s.get("status", "Available")  # Default status to "Available"
-            }) for s in schedules
-        ])
+    await alert_schedule(new_schedule)
 
-        return new_schedule[0]
-    return None
+    return RecordResponse(new_schedule[0])
 
 @app.get("/freighters/schedules")
-async def get_freighter_schedules():
-    conn = await connect_db()
-    schedules = await conn.fetch("SELECT * FROM get_all_freighter_schedules()")
-    await conn.close()
-    return schedules
+async def get_freighter_schedules(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    freighterid: Optional[uuid.UUID] = Query(None),
+    min_lat: Optional[float] = Query(None),
+    min_lng: Optional[float] = Query(None),
+    max_lat: Optional[float] = Query(None),
+    max_lng: Optional[float] = Query(None)
+):
+    bbox = parse_bbox(min_lat, min_lng, max_lat, max_lng)
+
+    if not any((limit, cursor, status, freighterid, bbox)):
+        async with acquire_db() as conn:
+            schedules = await get_all_freighter_schedules(conn)
+        return RecordResponse(schedules)
+
+    if cursor and limit is None:
+        limit = MAX_PAGE_SIZE
+    sql, args = page_query(
+        "freighterschedules", "createdat", "scheduleid",
+        filters={"status": status, "freighterid": freighterid},
+        bbox_columns=("departurelat", "departurelng"), bbox=bbox,
+        cursor=cursor, limit=limit
+    )
+
+    async with acquire_db() as conn:
+        schedules = await conn.fetch(sql, *args)
+
+    cursor = next_cursor(schedules, limit, "createdat", "scheduleid")
+    return RecordResponse(schedules, headers={NEXT_CURSOR_HEADER: cursor} if cursor else None)
 
 # ==============================
 # ✅ Shipment Requests
 # ==============================
 
 @app.get("/shipments/requests")
-async def get_shipment_request(request_id: Optional[str] = Query(None)):
-    conn = await connect_db()
-
+async def get_shipment_request(
+    request_id: Optional[uuid.UUID] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    clientid: Optional[uuid.UUID] = Query(None),
+    min_lat: Optional[float] = Query(None),
+    min_lng: Optional[float] = Query(None),
+    max_lat: Optional[float] = Query(None),
+    max_lng: Optional[float] = Query(None)
+):
     if request_id:
-        requests = await conn.fetch(
-            "SELECT * FROM shipmentrequests WHERE requestid = $1", request_id
-        )
-    else:
-        requests = await conn.fetch("SELECT * FROM shipmentrequests")
+        async with acquire_db() as conn:
+            return RecordResponse(await conn.fetch(
+                "SELECT * FROM shipmentrequests WHERE requestid = $1", request_id
+            ))
+
+    if cursor and limit is None:
+        limit = MAX_PAGE_SIZE
+    sql, args = page_query(
+        "shipmentrequests", "createdat", "requestid",
+        filters={"status": status, "clientid": clientid},
+        bbox_columns=("originlat", "originlng"), bbox=parse_bbox(min_lat, min_lng, max_lat, max_lng),
+        cursor=cursor, limit=limit
+    )
+
+    async with acquire_db() as conn:
+        requests = await conn.fetch(sql, *args)
 
-    await conn.close()
-    return requests
+    cursor = next_cursor(requests, limit, "createdat", "requestid")
+    return RecordResponse(requests, headers={NEXT_CURSOR_HEADER: cursor} if cursor else None)
 
 
 @app.post("/shipments/requests")
 async def post_shipment_request(request: Request):
     body = await request.json()
-    conn = await connect_db()
 
     requestid = body.get("requestid", uuid.uuid4())
+    expected_lastupdated = parse_expected_lastupdated(body)
 
-    has_shipment = await conn.fetch("SELECT 1 FROM shipmentrequests WHERE requestid = $1", requestid)
-
-    new_request = await conn.fetch(
-        "SELECT * FROM " + ("insert" if len(has_shipment) == 0 else "update") + "_shipment_request($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)",
-        requestid, body["clientid"], body["origincity"], body["originlat"], body["originlng"],
-        body["destinationcity"], body["destinationlat"], body["destinationlng"],
-        body["weightkg"], body["specialhandling"], body["status"]
-    )
+    async with acquire_db() as conn:
+        new_request = await upsert_shipment_request(
+            conn, requestid, body["clientid"], body["origincity"], body["originlat"], body["originlng"],
+            body["destinationcity"], body["destinationlat"], body["destinationlng"],
+            body["weightkg"], body["specialhandling"], body["status"], expected_lastupdated
+        )
 
-    requests = await conn.fetch("""SELECT * FROM shipmentrequests""")
+        if not new_request:
+            current = await conn.fetchval("SELECT lastupdated FROM shipmentrequests WHERE requestid = $1", uuid.UUID(str(requestid)))
+            raise_conflict("Shipment request", requestid, current)
 
-    await conn.close()
+    await publish_change("shipment", new_request[0])
 
+    await alert_shipment(new_request)
 
-    await alert_shipment([
-        ShipmentRequests(**{
-            "requestid": str(s["requestid"]),  # Ensure correct field names
-            "clientid": str(s["clientid"]),  # Ensure client_id is correctly mapped
-            "origincity": s["origincity"],
-            "originlat": float(s["originlat"]),
-            "originlng": float(s["originlng"]),
-            "destinationcity": s["destinationcity"],
-            "destinationlat": float(s["destinationlat"]),
-            "destinationlng": float(s["destinationlng"]),
-            "weightkg": float(s["weightkg"]),
-            "specialhandling": "none",  # Optional field
-            "status": s["status"],
-            "createdat": s["createdat"],
-            "lastupdated": s["lastupdated"],
-        }) for s in requests
-    ])
+    return RecordResponse(new_request[0])
 
+@app.get("/shipments/matches")
+async def get_shipment_matches(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    clientid: Optional[uuid.UUID] = Query(None),
+    freighterid: Optional[uuid.UUID] = Query(None)
+):
+    if cursor and limit is None:
+        limit = MAX_PAGE_SIZE
+    sql, args = page_query(
+        "shipmentmatches", "matchedat", "matchid",
+        filters={"status": status, "clientid": clientid, "freighterid": freighterid},
+        cursor=cursor, limit=limit
+    )
 
-    return new_request[0]
+    async with acquire_db() as conn:
+        matches = await conn.fetch(sql, *args)
 
-@app.get("/shipments/matches")
-async def get_shipment_matches():
-    conn = await connect_db()
-    matches = await conn.fetch("SELECT * FROM shipmentmatches")
-    await conn.close()
-    return matches
+    cursor = next_cursor(matches, limit, "matchedat", "matchid")
+    return RecordResponse(matches, headers={NEXT_CURSOR_HEADER: cursor} if cursor else None)
 
+# ==============================
+# ✅ Exports
+# ==============================
 
+@app.get("/shipments/requests/export")
+async def export_shipment_requests(format: str = Query("ndjson"), since: Optional[datetime] = Query(None)):
+    sql, args = export_query("shipmentrequests", "lastupdated", "requestid", since)
+    return StreamingResponse(stream_rows(sql, args, format), media_type=media_type(format))
 
+@app.get("/shipments/matches/export")
+async def export_shipment_matches(format: str = Query("ndjson"), since: Optional[datetime] = Query(None)):
+    sql, args = export_query("shipmentmatches", "lastupdated", "matchid", since)
+    return StreamingResponse(stream_rows(sql, args, format), media_type=media_type(format))
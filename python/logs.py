@@ -0,0 +1,90 @@
+import sys
+import logging
+from serialization import dumps_text
+
+# Every backend logger lives under this name, so configure_logging can set
+# their level and format without touching uvicorn's or the libraries' loggers.
+ROOT_LOGGER = "freight"
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One line per record: "time level logger: message key=value ...", or a
+    JSON object with the same keys when json_output is set.
+    """
+
+    def __init__(self, json_output=False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record):
+        fields = getattr(record, "fields", None) or {}
+
+        if self.json_output:
+            entry = {
+                "time": self.formatTime(record),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+                **{key: value if isinstance(value, (str, int, float, bool, type(None))) else str(value) for key, value in fields.items()}
+            }
+            if record.exc_info:
+                entry["exception"] = self.formatException(record.exc_info)
+            return dumps_text(entry)
+
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class StructuredLogger:
+    """
+    logging.Logger taking fields as keyword arguments:
+
+        log.debug("match created", scheduleid=scheduleid, requestid=requestid)
+
+    Disabled levels return before a record is built, so debug calls in hot
+    loops cost a level check. Keep messages constant and put the variable
+    parts in fields (an f-string message is formatted even when disabled).
+    """
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+    def log(self, level, message, exc_info=False, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, message, **fields):
+        self.log(logging.DEBUG, message, **fields)
+
+    def info(self, message, **fields):
+        self.log(logging.INFO, message, **fields)
+
+    def warning(self, message, **fields):
+        self.log(logging.WARNING, message, **fields)
+
+    def error(self, message, **fields):
+        self.log(logging.ERROR, message, **fields)
+
+    def exception(self, message, **fields):
+        """error() with the traceback of the exception being handled."""
+        self.log(logging.ERROR, message, exc_info=True, **fields)
+
+
+def get_logger(name):
+    return StructuredLogger(name)
+
+
+def configure_logging(level="INFO", fmt="text"):
+    """Send the backend's loggers to stdout at level, as "text" or "json" lines."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(json_output=fmt == "json"))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
@@ -0,0 +1,123 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+# Upper bound on the number of cells in one freighter x shipment distance block
+# (4M float64 cells ~= 32 MB). Larger fleets are processed in row chunks.
+MAX_MATRIX_CELLS = 4_000_000
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_matrix(lats1, lngs1, lats2, lngs2):
+    """
+    Vectorized haversine. Returns a len(lats1) x len(lats2) matrix of
+    great circle distances in kilometers.
+    """
+    lat1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    lng1 = np.radians(np.asarray(lngs1, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    lng2 = np.radians(np.asarray(lngs2, dtype=np.float64))[None, :]
+    return _haversine(lat1, lng1, lat2, lng2)
+
+
+def haversine_pairwise(lats1, lngs1, lats2, lngs2):
+    """Element-wise haversine: distance in kilometers between point i of each side."""
+    return _haversine(
+        np.radians(np.asarray(lats1, dtype=np.float64)),
+        np.radians(np.asarray(lngs1, dtype=np.float64)),
+        np.radians(np.asarray(lats2, dtype=np.float64)),
+        np.radians(np.asarray(lngs2, dtype=np.float64))
+    )
+
+
+def greedy_match(freighter_lats, freighter_lngs, freighter_capacity,
+                 shipment_lats, shipment_lngs, shipment_weights,
+                 max_matrix_cells=MAX_MATRIX_CELLS):
+    """
+    Greedy nearest-first assignment of shipments to freighters.
+
+    Freighters are visited in input order. Each one takes the still-pending
+    shipments that fit its remaining capacity, nearest origin first (ties keep
+    input order), until it is full. This is the same result the per-freighter
+    sort in service.match_freighters_to_shipments produced, but distances are
+    computed in NumPy blocks of at most max_matrix_cells.
+
+    Returns a list of (freighter_index, shipment_index, remaining_capacity)
+    tuples in the order the matches were made.
+    """
+    weights = np.asarray(shipment_weights, dtype=np.float64)
+    capacity = np.asarray(freighter_capacity, dtype=np.float64)
+    freighter_count = len(capacity)
+    shipment_count = len(weights)
+
+    matches = []
+    if freighter_count == 0 or shipment_count == 0:
+        return matches
+
+    pending = np.ones(shipment_count, dtype=bool)
+    chunk = max(1, max_matrix_cells // shipment_count)
+
+    for start in range(0, freighter_count, chunk):
+        stop = min(start + chunk, freighter_count)
+        distances = haversine_matrix(
+            freighter_lats[start:stop], freighter_lngs[start:stop],
+            shipment_lats, shipment_lngs
+        )
+
+        for row, f in enumerate(range(start, stop)):
+            available_capacity = float(capacity[f])
+
+            # Capacity only shrinks, so anything too heavy now never fits later.
+            candidates = np.flatnonzero(pending & (weights <= available_capacity))
+            if not len(candidates):
+                continue
+
+            order = candidates[np.argsort(distances[row, candidates], kind="stable")]
+
+            for s in order:
+                weight = float(weights[s])
+                if weight <= available_capacity:
+                    pending[s] = False
+                    available_capacity -= weight
+                    matches.append((f, int(s), available_capacity))
+
+                    if available_capacity <= 0:
+                        break
+
+        if not pending.any():
+            break
+
+    return matches
+
+
+def greedy_match_candidates(freighter_capacity, shipment_weights, candidates):
+    """
+    greedy_match over precomputed candidate lists instead of a distance
+    matrix: candidates[f] holds the shipment indexes freighter f may take,
+    nearest first (e.g. from the nearby_pending_shipments procedure).
+    Freighters are visited in order and the result has the same shape.
+    """
+    pending = [True] * len(shipment_weights)
+    matches = []
+
+    for f, shipment_indexes in enumerate(candidates):
+        available_capacity = float(freighter_capacity[f])
+
+        for s in shipment_indexes:
+            weight = float(shipment_weights[s])
+            if pending[s] and weight <= available_capacity:
+                pending[s] = False
+                available_capacity -= weight
+                matches.append((f, s, available_capacity))
+
+                if available_capacity <= 0:
+                    break
+
+    return matches
@@ -0,0 +1,408 @@
+import re
+import math
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+# Everything here is per process; in cluster mode each worker reports its own.
+
+# Upper bounds (seconds) of the histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Fixed-bucket histogram: constant memory, cheap to observe, exported as Prometheus buckets."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding the q-th value (like histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.sum / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+            "max_ms": self.max * 1000
+        }
+
+
+class RouteStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses = Counter()
+
+
+class QueryStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.rows = 0
+        self.errors = 0
+
+
+# ==============================
+# Rolling windows
+# ==============================
+
+# The metrics_update stream covers the last WINDOW_SLOTS * WINDOW_SLOT_SECONDS
+# seconds. Latencies are counted in log-spaced buckets (each SKETCH_GAMMA times
+# the one before), so quantiles are within ~2.5% and a window holds at most
+# slots x buckets counters however many requests it sees.
+WINDOW_SLOTS = 12
+WINDOW_SLOT_SECONDS = 5
+SKETCH_MIN_SECONDS = 0.00001
+SKETCH_GAMMA = 1.05
+_LOG_GAMMA = math.log(SKETCH_GAMMA)
+
+# Rates right after startup are over the time since then, not the full window
+_process_started = time.monotonic()
+
+def sketch_bucket(seconds):
+    if seconds <= SKETCH_MIN_SECONDS:
+        return 0
+    return math.ceil(math.log(seconds / SKETCH_MIN_SECONDS) / _LOG_GAMMA)
+
+def sketch_value(bucket):
+    # The value with the same relative error to both ends of the bucket
+    return SKETCH_MIN_SECONDS * SKETCH_GAMMA ** bucket * 2 / (1 + SKETCH_GAMMA)
+
+
+class RollingWindow:
+    """
+    Count, error count, latency sum and latency sketch over a sliding window,
+    kept as a ring of time slots. A slot is reset when the ring comes back
+    around to it, so nothing has to expire old observations.
+    """
+
+    def __init__(self, slots=WINDOW_SLOTS, slot_seconds=WINDOW_SLOT_SECONDS):
+        self.slot_seconds = slot_seconds
+        self.epochs = [None] * slots
+        self.counts = [0] * slots
+        self.errors = [0] * slots
+        self.sums = [0.0] * slots
+        self.buckets = [Counter() for _ in range(slots)]
+
+    def _slot(self, epoch):
+        i = epoch % len(self.epochs)
+        if self.epochs[i] != epoch:
+            self.epochs[i] = epoch
+            self.counts[i] = 0
+            self.errors[i] = 0
+            self.sums[i] = 0.0
+            self.buckets[i].clear()
+        return i
+
+    def observe(self, seconds, error=False):
+        i = self._slot(int(time.monotonic() // self.slot_seconds))
+        self.counts[i] += 1
+        self.sums[i] += seconds
+        self.buckets[i][sketch_bucket(seconds)] += 1
+        if error:
+            self.errors[i] += 1
+
+    def snapshot(self):
+        now = time.monotonic()
+        oldest = int(now // self.slot_seconds) - len(self.epochs) + 1
+        live = [i for i, epoch in enumerate(self.epochs) if epoch is not None and epoch >= oldest]
+
+        count = sum(self.counts[i] for i in live)
+        errors = sum(self.errors[i] for i in live)
+        total = sum(self.sums[i] for i in live)
+        merged = Counter()
+        for i in live:
+            merged.update(self.buckets[i])
+
+        def quantile(q):
+            if not count:
+                return 0.0
+            rank = max(1, math.ceil(q * count))
+            seen = 0
+            for bucket in sorted(merged):
+                seen += merged[bucket]
+                if seen >= rank:
+                    return sketch_value(bucket) * 1000
+            return 0.0
+
+        span = min(now - oldest * self.slot_seconds, now - _process_started)
+        return {
+            "count": count,
+            "per_second": count / span if span > 0 else 0.0,
+            "error_rate": errors / count if count else 0.0,
+            "avg_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": quantile(0.5),
+            "p99_ms": quantile(0.99)
+        }
+
+
+# ==============================
+# Per-process state
+# ==============================
+
+route_stats = defaultdict(RouteStats)  # (method, route template) -> RouteStats
+query_stats = defaultdict(QueryStats)  # query label -> QueryStats
+loop_lag = Histogram(LAG_BUCKETS)
+matcher_passes = Histogram()
+matcher_counts = Counter()  # matches, stale_schedules, stale_requests
+
+route_windows = defaultdict(RollingWindow)  # (method, route template) -> RollingWindow
+request_window = RollingWindow()
+loop_lag_window = RollingWindow()
+matcher_window = RollingWindow()
+http_in_flight = 0
+
+# Queries are also timed from the SQLAlchemy engine's worker threads
+_query_lock = threading.Lock()
+
+
+# ==============================
+# Recording
+# ==============================
+
+def observe_request(method, route, status, seconds):
+    stats = route_stats[(method, route)]
+    stats.latency.observe(seconds)
+    stats.statuses[status] += 1
+
+    error = status >= 500
+    route_windows[(method, route)].observe(seconds, error)
+    request_window.observe(seconds, error)
+
+
+_QUERY_VERB = re.compile(r"^\s*(\w+)")
+_QUERY_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+_query_labels = {}
+
+def query_label(sql):
+    """Short, low-cardinality name for a query: its verb and first table or function ("select users")."""
+    label = _query_labels.get(sql)
+    if label is None:
+        verb = _QUERY_VERB.match(sql)
+        table = _QUERY_TABLE.search(sql)
+        label = " ".join(part.group(1).lower() for part in (verb, table) if part) or "other"
+        _query_labels[sql] = label
+    return label
+
+def observe_query(sql, seconds, rows, error=False):
+    label = query_label(sql)
+    with _query_lock:
+        stats = query_stats[label]
+        stats.latency.observe(seconds)
+        stats.rows += rows
+        if error:
+            stats.errors += 1
+
+def command_rows(status):
+    """Row count from a command status such as "UPDATE 3" or "INSERT 0 1"."""
+    count = status.rsplit(" ", 1)[-1] if status else ""
+    return int(count) if count.isdigit() else 0
+
+def observe_matcher_pass(seconds, matches, stale_schedules=0, stale_requests=0):
+    matcher_passes.observe(seconds)
+    matcher_window.observe(seconds)
+    matcher_counts["matches"] += matches
+    matcher_counts["stale_schedules"] += stale_schedules
+    matcher_counts["stale_requests"] += stale_requests
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its last body chunk is
+    sent (so streamed exports count in full), labelled by route template
+    rather than path so ids don't create new series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        global http_in_flight
+        start = time.perf_counter()
+        status = 500
+        http_in_flight += 1
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight -= 1
+            route = scope.get("route")
+            observe_request(scope["method"], route.path if route else "unmatched", status, time.perf_counter() - start)
+
+
+async def monitor_event_loop_lag(interval=0.5):
+    """Sleep interval seconds at a time and record how late each wakeup is; runs until cancelled."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        loop_lag.observe(lag)
+        loop_lag_window.observe(lag)
+
+
+def instrument_engine(engine):
+    """Record the queries of a SQLAlchemy engine (the thread matcher's) alongside the asyncpg ones."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        observe_query(statement, time.perf_counter() - context.metrics_start, max(cursor.rowcount, 0))
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        if context is not None and hasattr(context, "metrics_start"):
+            observe_query(exception_context.statement or "", time.perf_counter() - context.metrics_start, 0, error=True)
+
+
+# ==============================
+# Export
+# ==============================
+
+def metrics_snapshot(gauges=None):
+    """Every metric as JSON-friendly summaries (latencies in ms)."""
+    routes = {}
+    for (method, route), stats in sorted(route_stats.items()):
+        errors = sum(count for status, count in stats.statuses.items() if status >= 500)
+        routes[f"{method} {route}"] = {
+            **stats.latency.summary(),
+            "errors": errors,
+            "error_rate": errors / stats.latency.count if stats.latency.count else 0.0,
+            "statuses": dict(stats.statuses)
+        }
+
+    with _query_lock:
+        queries = {
+            label: {**stats.latency.summary(), "rows": stats.rows, "errors": stats.errors}
+            for label, stats in sorted(query_stats.items())
+        }
+
+    return {
+        "routes": routes,
+        "queries": queries,
+        "event_loop_lag": loop_lag.summary(),
+        "matcher": {**matcher_passes.summary(), **matcher_counts},
+        "gauges": gauges or {}
+    }
+
+
+def metrics_update(gauges=None):
+    """Rolling-window aggregates for the metrics_update WebSocket message."""
+    routes = {}
+    for (method, route), window in sorted(route_windows.items()):
+        snapshot = window.snapshot()
+        if snapshot["count"]:
+            routes[f"{method} {route}"] = snapshot
+
+    return {
+        "window_s": WINDOW_SLOTS * WINDOW_SLOT_SECONDS,
+        "requests": request_window.snapshot(),
+        "routes": routes,
+        "event_loop_lag": loop_lag_window.snapshot(),
+        "matcher": matcher_window.snapshot(),
+        "http_in_flight": http_in_flight,
+        **(gauges or {})
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(**labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+def _histogram_lines(name, histogram, **labels):
+    prefix = _labels(**labels)
+    prefix = f"{prefix}," if prefix else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{_labels(**labels)}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+def render_prometheus(gauges=None):
+    """Every metric in the Prometheus text exposition format."""
+    lines = [
+        "# HELP http_request_duration_seconds HTTP request latency by route.",
+        "# TYPE http_request_duration_seconds histogram"
+    ]
+    for (method, route), stats in sorted(route_stats.items()):
+        lines += _histogram_lines("http_request_duration_seconds", stats.latency, method=method, route=route)
+
+    lines += ["# HELP http_requests_total HTTP requests by route and status.", "# TYPE http_requests_total counter"]
+    for (method, route), stats in sorted(route_stats.items()):
+        for status, count in sorted(stats.statuses.items()):
+            lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+    with _query_lock:
+        queries = sorted(query_stats.items())
+        lines += ["# HELP db_query_duration_seconds Database query time by query.", "# TYPE db_query_duration_seconds histogram"]
+        for label, stats in queries:
+            lines += _histogram_lines("db_query_duration_seconds", stats.latency, query=label)
+        lines += ["# HELP db_query_rows_total Rows returned or affected by query.", "# TYPE db_query_rows_total counter"]
+        lines += [f"db_query_rows_total{{{_labels(query=label)}}} {stats.rows}" for label, stats in queries]
+        lines += ["# HELP db_query_errors_total Failed queries by query.", "# TYPE db_query_errors_total counter"]
+        lines += [f"db_query_errors_total{{{_labels(query=label)}}} {stats.errors}" for label, stats in queries]
+
+    lines += ["# HELP event_loop_lag_seconds Delay of the event loop's periodic wakeups.", "# TYPE event_loop_lag_seconds histogram"]
+    lines += _histogram_lines("event_loop_lag_seconds", loop_lag)
+
+    lines += ["# HELP matcher_pass_duration_seconds Duration of matcher passes.", "# TYPE matcher_pass_duration_seconds histogram"]
+    lines += _histogram_lines("matcher_pass_duration_seconds", matcher_passes)
+    lines += ["# HELP matcher_matches_total Matches persisted by the matcher.", "# TYPE matcher_matches_total counter"]
+    lines.append(f"matcher_matches_total {matcher_counts['matches']}")
+    lines += ["# HELP matcher_stale_rows_total Rows a matcher pass found changed concurrently.", "# TYPE matcher_stale_rows_total counter"]
+    lines.append(f'matcher_stale_rows_total{{table="freighterschedules"}} {matcher_counts["stale_schedules"]}')
+    lines.append(f'matcher_stale_rows_total{{table="shipmentrequests"}} {matcher_counts["stale_requests"]}')
+
+    for name, value in (gauges or {}).items():
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+
+    return "\n".join(lines) + "\n"
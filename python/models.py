@@ -38,6 +38,8 @@ class FreighterSchedules(SQLModel, table=True):
     maxloadkg: Optional[float] = None
     availablekg: Optional[float] = None
     status: str = "Available"
+    createdat: Optional[datetime] = None
+    lastupdated: Optional[datetime] = None
 
 
     def __hash__(self):
@@ -0,0 +1,76 @@
+import base64
+import uuid
+from datetime import datetime
+from fastapi import HTTPException
+
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), uuid.UUID(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_bbox(min_lat, min_lng, max_lat, max_lng):
+    bounds = (min_lat, min_lng, max_lat, max_lng)
+    if all(b is None for b in bounds):
+        return None
+    if any(b is None for b in bounds):
+        raise HTTPException(status_code=400, detail="min_lat, min_lng, max_lat and max_lng must be given together")
+    return bounds
+
+
+def page_query(table, time_column, id_column, filters=None, bbox_columns=None, bbox=None, cursor=None, limit=None):
+    """
+    Build a keyset-paginated SELECT over table ordered by (time_column, id_column).
+
+    filters maps column -> value (None values are skipped); bbox is
+    (min_lat, min_lng, max_lat, max_lng) applied to bbox_columns (lat, lng).
+    Returns (sql, args).
+    """
+    clauses = []
+    args = []
+
+    for column, value in (filters or {}).items():
+        if value is None:
+            continue
+        args.append(value)
+        clauses.append(f"{column} = ${len(args)}")
+
+    if bbox is not None:
+        lat_column, lng_column = bbox_columns
+        args.extend(bbox)
+        n = len(args)
+        clauses.append(f"{lat_column} BETWEEN ${n - 3} AND ${n - 1} AND {lng_column} BETWEEN ${n - 2} AND ${n}")
+
+    if cursor is not None:
+        timestamp, row_id = decode_cursor(cursor)
+        args.extend([timestamp, row_id])
+        n = len(args)
+        clauses.append(f"({time_column}, {id_column}) > (${n - 1}, ${n})")
+
+    sql = f"SELECT * FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if limit is not None:
+        args.append(limit)
+        sql += f" ORDER BY {time_column}, {id_column} LIMIT ${len(args)}"
+
+    return sql, args
+
+
+def next_cursor(rows, limit, time_column, id_column):
+    """Cursor for the page after rows, or None when this was the last page."""
+    if limit is None or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last[time_column], last[id_column])
@@ -0,0 +1,211 @@
+import time
+import random
+import asyncio
+import inspect
+from startup import env
+from metrics import Histogram
+from logs import get_logger
+
+log = get_logger("scheduler")
+
+FIXED_RATE = "fixed_rate"  # ticks start every interval seconds, however long each one takes
+FIXED_DELAY = "fixed_delay"  # the next tick starts interval seconds after the previous one finished
+
+RESTART_DELAY = env.get("scheduler", {}).get("restart_delay", 1)  # seconds before the first retry of a failed tick
+MAX_RESTART_DELAY = env.get("scheduler", {}).get("max_restart_delay", 60)
+
+
+class Job:
+    """
+    A background job: func is awaited once per tick, never twice at a time.
+
+    interval None runs func once, retrying until it returns; use it for
+    long-running loops and one-off startup work. Otherwise ticks repeat in
+    FIXED_RATE or FIXED_DELAY mode. A FIXED_RATE tick that runs past the
+    start of the next one is an overrun: the ticks it missed are skipped
+    rather than run back to back.
+
+    backlog, if given, is called (sync or async) before each tick and returns
+    how much work is pending. With none the tick is skipped and the job waits
+    max_interval; otherwise the interval shrinks from interval toward
+    min_interval as the backlog grows, halving at backlog_target.
+
+    wakeup, if given, is an asyncio.Event that starts the next tick early.
+
+    A tick that raises is logged and retried after an exponential backoff
+    with jitter, so a failing job neither dies nor retries in lockstep.
+    """
+
+    def __init__(
+        self, name, func, interval=None, mode=FIXED_DELAY, backlog=None, min_interval=None, max_interval=None,
+        backlog_target=100, wakeup=None
+    ):
+        if mode not in (FIXED_RATE, FIXED_DELAY):
+            raise ValueError(f"Unknown job mode: {mode}")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.mode = mode
+        self.backlog = backlog
+        self.min_interval = interval if min_interval is None else min_interval
+        self.max_interval = interval if max_interval is None else max_interval
+        self.backlog_target = backlog_target
+        self.wakeup = wakeup
+        self.task = None
+
+        self.state = "stopped"
+        self.durations = Histogram()
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.overruns = 0
+        self.missed_ticks = 0
+        self.idle_skips = 0
+        self.current_interval = interval
+        self.last_backlog = None
+        self.last_duration = None
+        self.last_finished = None
+        self.last_error = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run(), name=f"job:{self.name}")
+        return self.task
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def adaptive_interval(self, backlog):
+        if backlog is None:
+            return self.interval
+        return max(self.min_interval, self.interval * self.backlog_target / (self.backlog_target + backlog))
+
+    async def pending(self):
+        if self.backlog is None:
+            return None
+        backlog = self.backlog()
+        if inspect.isawaitable(backlog):
+            backlog = await backlog
+        self.last_backlog = backlog
+        return backlog
+
+    async def wait_until(self, deadline, interruptible):
+        delay = deadline - time.monotonic()
+        if interruptible and self.wakeup is not None:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=max(0, delay))
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+        elif delay > 0:
+            await asyncio.sleep(delay)
+
+    async def run(self):
+        next_start = time.monotonic()
+        interruptible = True
+
+        try:
+            while True:
+                if interruptible:
+                    self.state = "waiting"
+                await self.wait_until(next_start, interruptible)
+                interruptible = True
+                # A wakeup runs the tick early; the fixed-rate schedule counts from it
+                scheduled = min(next_start, time.monotonic())
+
+                self.state = "running"
+                start = time.monotonic()
+                try:
+                    backlog = await self.pending()
+                    if backlog == 0:
+                        self.idle_skips += 1
+                        self.current_interval = self.max_interval
+                        next_start = scheduled + self.max_interval
+                        continue
+
+                    await self.func()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    self.consecutive_failures += 1
+                    self.last_error = repr(e)
+                    delay = min(MAX_RESTART_DELAY, RESTART_DELAY * 2 ** (self.consecutive_failures - 1))
+                    delay *= random.uniform(0.5, 1.5)
+                    log.exception(
+                        "job failed", job=self.name, failures=self.consecutive_failures, retry_in_s=round(delay, 2)
+                    )
+                    self.state = "backoff"
+                    next_start = time.monotonic() + delay
+                    interruptible = False
+                    continue
+
+                end = time.monotonic()
+                duration = end - start
+                self.runs += 1
+                self.consecutive_failures = 0
+                self.durations.observe(duration)
+                self.last_duration = duration
+                self.last_finished = time.time()
+
+                if self.interval is None:
+                    return
+
+                interval = self.current_interval = self.adaptive_interval(backlog)
+                if self.mode == FIXED_RATE:
+                    next_start = scheduled + interval
+                    if end > next_start:
+                        missed = int((end - next_start) // interval) + 1
+                        next_start += missed * interval
+                        self.overruns += 1
+                        self.missed_ticks += missed
+                        log.debug("job overran", job=self.name, duration_ms=round(duration * 1000, 1), missed=missed)
+                else:
+                    next_start = end + interval
+                    if duration > interval:
+                        self.overruns += 1
+                        log.debug("job overran", job=self.name, duration_ms=round(duration * 1000, 1))
+        finally:
+            self.state = "stopped"
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "mode": self.mode if self.interval is not None else "once",
+            "interval_s": self.current_interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "overruns": self.overruns,
+            "missed_ticks": self.missed_ticks,
+            "idle_skips": self.idle_skips,
+            "backlog": self.last_backlog,
+            "last_duration_ms": self.last_duration * 1000 if self.last_duration is not None else None,
+            "last_finished": self.last_finished,
+            "last_error": self.last_error,
+            "duration": self.durations.summary()
+        }
+
+
+class JobScheduler:
+    """Named set of jobs started and stopped together; stats survive restarts (e.g. a new leader term)."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add(self, job):
+        if job.name in self.jobs:
+            raise ValueError(f"Duplicate job name: {job.name}")
+        self.jobs[job.name] = job
+        return job
+
+    def start(self):
+        """Start every job; returns their tasks."""
+        return [job.start() for job in self.jobs.values()]
+
+    async def stop(self):
+        await asyncio.gather(*(job.stop() for job in self.jobs.values()))
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
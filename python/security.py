@@ -2,6 +2,12 @@ import bcrypt
 import jwt
 from uuid import uuid4
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import threading
+import time
 import os
 import json
 from fastapi import Depends, HTTPException, Request, Response, Security
@@ -22,6 +28,60 @@ def create_jwt_token(data: dict, expires_delta: timedelta):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, secret, algorithm=algorithm)
 
+class TokenCache:
+    """
+    Bounded LRU of already verified tokens, keyed by a hash of the token.
+    Entries expire at the token's own "exp", so a cached payload is never
+    served for a token jwt.decode would reject as expired.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()  # token hash -> (payload, exp)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            payload, exp = entry
+            if exp <= time.time():
+                del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload):
+        exp = payload.get("exp")
+        if exp is None:
+            return
+
+        with self.lock:
+            self.entries[key] = (payload, exp)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+token_cache = TokenCache(env["jwt"].get("cache_size", 10000))
+
 def verify_token(request: Request):
     jwt_token = request.cookies.get("fb_access_token")
 
@@ -38,13 +98,26 @@ def verify_token(request: Request):
     if not jwt_token:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    try:
-        payload = jwt.decode(jwt_token, secret, algorithms=[algorithm])
-        return payload  # ✅ Valid token, return payload (user data)
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    # Routes that check both identity and role only verify once per request
+    cached = getattr(request.state, "token_payload", None)
+    if cached is not None:
+        return cached
+
+    key = hashlib.sha256(jwt_token.encode()).hexdigest()
+    payload = token_cache.get(key)
+
+    if payload is None:
+        try:
+            payload = jwt.decode(jwt_token, secret, algorithms=[algorithm])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        token_cache.put(key, payload)
+
+    request.state.token_payload = payload
+    return payload  # ✅ Valid token, return payload (user data)
 
 def verify_role(request: Request, required_role: str):
 	payload = verify_token(request)
@@ -57,6 +130,14 @@ def verify_role(request: Request, required_role: str):
 
 	return payload
 
+def require_role(required_role: str):
+    """FastAPI dependency factory: Depends(require_role("Admin"))."""
+    def dependency(payload: dict = Depends(verify_token)):
+        if payload.get("role") != required_role:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return payload
+    return dependency
+
 def verify_admin(security_scopes: SecurityScopes, payload: dict = Depends(verify_token)):
     # print("\n VERIFY ROLE: ", payload)
     # print("\n")
@@ -64,8 +145,87 @@ def verify_admin(security_scopes: SecurityScopes, payload: dict = Depends(verify
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return payload
 
+bcrypt_rounds = env.get("bcrypt", {}).get("rounds", 12)
+
 def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=bcrypt_rounds)
     hashed = bcrypt.hashpw(password.encode(), salt)
     return hashed.decode()
 
+def check_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+# ==============================
+# Password worker pool
+# ==============================
+#
+# bcrypt releases the GIL, so a thread pool sized to the cores gives real
+# parallelism while keeping the event loop (and WebSocket broadcasts) free.
+
+class PasswordPool:
+    def __init__(self, workers, max_queue):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _dequeue(self, job):
+        """Count a job out of the queue once: when it starts, or when its caller gave up before that."""
+        if not job["dequeued"]:
+            job["dequeued"] = True
+            self.queued -= 1
+
+    def _run(self, job, fn, *args):
+        with self.lock:
+            self._dequeue(job)
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def submit(self, fn, *args):
+        with self.lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server busy, try again")
+            self.queued += 1
+
+        # A request cancelled while its job waits for a worker cancels the job
+        # too, and _run never gets to count it out of the queue.
+        job = {"dequeued": False}
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, self._run, job, fn, *args)
+        finally:
+            with self.lock:
+                self._dequeue(job)
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "rounds": bcrypt_rounds,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "max_queue": self.max_queue
+        }
+
+password_pool = PasswordPool(
+    env.get("bcrypt", {}).get("workers", os.cpu_count() or 1),
+    env.get("bcrypt", {}).get("max_queue", 1000)
+)
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.submit(hash_password, password)
+
+async def check_password_async(password: str, hashed: str) -> bool:
+    return await password_pool.submit(check_password, password, hashed)
+
@@ -0,0 +1,111 @@
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from asyncpg import Record
+from fastapi.responses import Response
+
+# orjson encodes UUID and datetime natively and is several times faster than
+# json; without it everything still works through the json fallback.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Record):
+        return dict(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(obj):
+    """Encode obj (Records, lists of Records, dicts...) as JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+
+def dumps_text(obj):
+    """Same as dumps, as a str for WebSocket text frames and NOTIFY payloads."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, default=_default, separators=(",", ":"))
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class RecordResponse(Response):
+    """
+    JSON response that encodes asyncpg Records directly. Routes return it
+    explicitly, which skips FastAPI's jsonable_encoder pass over every row.
+    """
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+# ==============================
+# Broadcast payloads
+# ==============================
+#
+# WebSocket payloads built from schedule/shipment/match rows (Records or
+# dicts), shared by the snapshot and the delta messages.
+
+def schedule_payload(s):
+    return {
+        "scheduleid": str(s["scheduleid"]),
+        "freighterid": str(s["freighterid"]),
+        "departurecity": s["departurecity"],
+        "departurelat": float(s["departurelat"]),
+        "departurelng": float(s["departurelng"]),
+        "arrivalcity": s["arrivalcity"],
+        "arrivallat": float(s["arrivallat"]) if s["arrivallat"] else "",
+        "arrivallng": float(s["arrivallng"]) if s["arrivallng"] else "",
+        "departuredate": s["departuredate"],
+        "arrivaldate": s["arrivaldate"],
+        "maxloadkg": float(s["maxloadkg"]),
+        "availablekg": float(s["availablekg"]),
+        "status": s.get("status", "Available")  # Default status to "Available"
+    }
+
+
+def shipment_payload(s):
+    return {
+        "requestid": str(s["requestid"]),
+        "clientid": str(s["clientid"]),
+        "origincity": s["origincity"],
+        "originlat": float(s["originlat"]),
+        "originlng": float(s["originlng"]),
+        "destinationcity": s["destinationcity"],
+        "destinationlat": float(s["destinationlat"]),
+        "destinationlng": float(s["destinationlng"]),
+        "weightkg": float(s["weightkg"]),
+        "specialhandling": "none",  # Optional field
+        "status": s["status"],
+        "createdat": s["createdat"],
+        "lastupdated": s["lastupdated"]
+    }
+
+
+def match_payload(m):
+    return { key: str(value) if value is not None else None for key, value in m.items() }
+
+
+def position_payload(row, key, lat, lng):
+    return {
+        key: str(row[key]),
+        lat: float(row[lat]),
+        lng: float(row[lng]),
+        "status": row["status"],
+        "lastupdated": row["lastupdated"]
+    }
@@ -1,9 +1,18 @@
 import math
+import time
 import asyncio
 import uuid
-from sqlalchemy import select
-from startup import connect_db_sync
+from datetime import datetime, timezone
+from sqlalchemy import select, text, func
+from startup import connect_db_sync, acquire_db, env
+from matching import greedy_match, greedy_match_candidates, MAX_MATRIX_CELLS
+from fleet import FleetState
 from models import FreighterSchedules, ShipmentRequests, ShipmentMatches 
+from logs import get_logger
+from metrics import observe_matcher_pass
+from scheduler import Job
+
+log = get_logger("matcher")
 
 
 def haversine(lat1, lng1, lat2, lng2):
@@ -19,6 +28,248 @@ def haversine(lat1, lng1, lat2, lng2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+def apply_matches(session, freighters, shipments, matches):
+    """
+    Record the engine's matches against ORM freighter/shipment objects.
+    Returns the (freighter, shipment) pairs that were matched.
+    """
+    matched = []
+
+    for freighter_index, shipment_index, available_capacity in matches:
+        freighter = freighters[freighter_index]
+        shipment = shipments[shipment_index]
+
+        # Create a match record in the shipment_matches table.
+        match_record = ShipmentMatches(
+            matchid=str(uuid.uuid4()),
+            clientid=str(shipment.clientid),
+            freighterid=str(freighter.freighterid),
+            requestid=str(shipment.requestid),
+            scheduleid=str(freighter.scheduleid),
+            status="matched"  # or "pending" based on your workflow
+        )
+        session.add(match_record)
+
+        # Update the shipment so that it won't be used again.
+        shipment.status = "matched"
+        shipment.lastupdated = func.bump_last_updated(ShipmentRequests.lastupdated)
+
+        # The engine already deducted the shipment's weight from the available capacity.
+        freighter.availablekg = float(available_capacity)
+        freighter.arrivallat = float(shipment.destinationlat)
+        freighter.arrivallng = float(shipment.destinationlng)
+        freighter.status = "in transit"
+        freighter.lastupdated = func.bump_last_updated(FreighterSchedules.lastupdated)
+
+        log.debug(
+            "match created", scheduleid=freighter.scheduleid, requestid=shipment.requestid,
+            weightkg=shipment.weightkg, availablekg=freighter.availablekg
+        )
+
+        matched.append((freighter, shipment))
+
+    return matched
+
+# ==============================
+# Bulk match persistence
+# ==============================
+
+# One statement per pass: insert every match, flip the matched shipments and
+# apply the final capacity/arrival of each matched freighter, all set-based.
+BULK_PERSIST_MATCHES = text("""
+    WITH new_matches AS (
+        INSERT INTO shipmentmatches (matchid, clientid, freighterid, requestid, scheduleid, status)
+        SELECT m.matchid, m.clientid, m.freighterid, m.requestid, m.scheduleid, 'matched'
+        FROM unnest(
+            CAST(:matchids AS uuid[]), CAST(:clientids AS uuid[]), CAST(:freighterids AS uuid[]),
+            CAST(:requestids AS uuid[]), CAST(:match_scheduleids AS uuid[])
+        ) AS m(matchid, clientid, freighterid, requestid, scheduleid)
+    ), matched_shipments AS (
+        UPDATE shipmentrequests
+        SET status = 'matched', lastupdated = bump_last_updated(lastupdated)
+        WHERE requestid = ANY(CAST(:requestids AS uuid[]))
+    )
+    UPDATE freighterschedules AS f
+    SET availablekg = u.availablekg,
+        arrivallat = u.arrivallat,
+        arrivallng = u.arrivallng,
+        status = 'in transit',
+        lastupdated = bump_last_updated(f.lastupdated)
+    FROM unnest(
+        CAST(:scheduleids AS uuid[]), CAST(:availablekg AS numeric[]),
+        CAST(:arrivallat AS double precision[]), CAST(:arrivallng AS double precision[])
+    ) AS u(scheduleid, availablekg, arrivallat, arrivallng)
+    WHERE f.scheduleid = u.scheduleid
+""")
+
+# ==============================
+# Optimistic concurrency
+# ==============================
+
+# Row locks for the rows a pass is about to write, in a fixed order so two
+# writers locking overlapping sets cannot deadlock each other.
+LOCK_SCHEDULES = text("""
+    SELECT scheduleid, status, lastupdated FROM freighterschedules
+    WHERE scheduleid = ANY(CAST(:ids AS uuid[]))
+    ORDER BY scheduleid
+    FOR UPDATE
+""")
+
+LOCK_REQUESTS = text("""
+    SELECT requestid, status, lastupdated FROM shipmentrequests
+    WHERE requestid = ANY(CAST(:ids AS uuid[]))
+    ORDER BY requestid
+    FOR UPDATE
+""")
+
+def matched_candidates(freighters, shipments, matches):
+    """The candidate rows matches would write, as ({scheduleid: row}, {requestid: row})."""
+    return (
+        {str(freighters[f]["scheduleid"]): freighters[f] for f, _, _ in matches},
+        {str(shipments[s]["requestid"]): shipments[s] for _, s, _ in matches}
+    )
+
+def current_matches(freighters, shipments, matches, schedules, requests):
+    """
+    Keep only the matches whose freighter and shipments still have the
+    LastUpdated (and status) the candidates were read with. schedules and
+    requests map id -> (status, lastupdated) of the locked rows. A freighter's
+    matches are kept or dropped together, since its remaining capacity
+    assumes all of them.
+
+    Returns (matches, stale_scheduleids, stale_requestids).
+    """
+    candidate_schedules, candidate_requests = matched_candidates(freighters, shipments, matches)
+
+    stale_schedules = {
+        scheduleid for scheduleid, candidate in candidate_schedules.items()
+        if schedules.get(scheduleid) != ("available", candidate["lastupdated"])
+    }
+    stale_requests = {
+        requestid for requestid, candidate in candidate_requests.items()
+        if requests.get(requestid) != ("pending", candidate["lastupdated"])
+    }
+
+    dropped = {
+        f for f, s, _ in matches
+        if str(freighters[f]["scheduleid"]) in stale_schedules or str(shipments[s]["requestid"]) in stale_requests
+    }
+    return [m for m in matches if m[0] not in dropped], stale_schedules, stale_requests
+
+def lock_current_matches(session, freighters, shipments, matches):
+    """
+    Lock the rows matches would write and drop the matches on rows written
+    since the candidates were read (see current_matches). The locks are held
+    until the caller commits.
+    """
+    candidate_schedules, candidate_requests = matched_candidates(freighters, shipments, matches)
+
+    schedules = {
+        str(row.scheduleid): (row.status, row.lastupdated)
+        for row in session.execute(LOCK_SCHEDULES, {"ids": list(candidate_schedules)})
+    }
+    requests = {
+        str(row.requestid): (row.status, row.lastupdated)
+        for row in session.execute(LOCK_REQUESTS, {"ids": list(candidate_requests)})
+    }
+    return current_matches(freighters, shipments, matches, schedules, requests)
+
+def model_row(obj):
+    """Plain column -> value dict for an ORM object, skipping pydantic serialization."""
+    return {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+
+def match_rows(freighters, shipments, matches):
+    """
+    Turn the engine's matches into plain rows for persist_matches_bulk.
+    freighters/shipments are mappings (candidate rows or model_row()s).
+    """
+    rows = []
+    for freighter_index, shipment_index, available_capacity in matches:
+        freighter = freighters[freighter_index]
+        shipment = shipments[shipment_index]
+        rows.append({
+            "matchid": str(uuid.uuid4()),
+            "clientid": str(shipment["clientid"]) if shipment["clientid"] else None,
+            "freighterid": str(freighter["freighterid"]) if freighter["freighterid"] else None,
+            "requestid": str(shipment["requestid"]),
+            "scheduleid": str(freighter["scheduleid"]),
+            "availablekg": float(available_capacity),
+            "arrivallat": float(shipment["destinationlat"]),
+            "arrivallng": float(shipment["destinationlng"])
+        })
+    return rows
+
+def persist_matches_bulk(session, rows):
+    """Write a pass's matches in a single round trip. The caller commits."""
+    if not rows:
+        return
+
+    # A freighter can take several shipments per pass; its last match holds the final state.
+    final_schedules = {row["scheduleid"]: row for row in rows}
+
+    session.execute(BULK_PERSIST_MATCHES, {
+        "matchids": [row["matchid"] for row in rows],
+        "clientids": [row["clientid"] for row in rows],
+        "freighterids": [row["freighterid"] for row in rows],
+        "requestids": [row["requestid"] for row in rows],
+        "match_scheduleids": [row["scheduleid"] for row in rows],
+        "scheduleids": list(final_schedules),
+        "availablekg": [row["availablekg"] for row in final_schedules.values()],
+        "arrivallat": [row["arrivallat"] for row in final_schedules.values()],
+        "arrivallng": [row["arrivallng"] for row in final_schedules.values()]
+    })
+
+NEARBY_PENDING_SHIPMENTS = text("""
+    SELECT scheduleid, requestid
+    FROM nearby_pending_shipments_for_schedules(CAST(:scheduleids AS uuid[]), :radius_km, :nearby_limit)
+""")
+
+def match_all(freighters, shipments):
+    """Greedy engine over candidate rows (mappings), measuring every freighter/shipment distance."""
+    return greedy_match(
+        [f["departurelat"] for f in freighters],
+        [f["departurelng"] for f in freighters],
+        [f["availablekg"] for f in freighters],
+        [s["originlat"] for s in shipments],
+        [s["originlng"] for s in shipments],
+        [s["weightkg"] for s in shipments]
+    )
+
+def match_nearby(freighters, shipments, nearby_rows):
+    """Greedy engine over the (scheduleid, requestid) pairs nearby_pending_shipments_for_schedules returned."""
+    freighter_index = {str(f["scheduleid"]): i for i, f in enumerate(freighters)}
+    shipment_index = {str(s["requestid"]): i for i, s in enumerate(shipments)}
+
+    # Shipments that are not in this pass's candidate set are skipped
+    candidates = [[] for _ in freighters]
+    for scheduleid, requestid in nearby_rows:
+        s = shipment_index.get(str(requestid))
+        if s is not None:
+            candidates[freighter_index[str(scheduleid)]].append(s)
+
+    return greedy_match_candidates(
+        [f["availablekg"] for f in freighters],
+        [s["weightkg"] for s in shipments],
+        candidates
+    )
+
+def find_matches(session, freighters, shipments):
+    """
+    Run the greedy engine over candidate rows (mappings). With matcher.radius_km
+    set, each freighter only considers the pending shipments within that radius,
+    looked up through the origin grid index instead of measuring the distance
+    to every shipment.
+    """
+    if MATCH_RADIUS_KM is None:
+        return match_all(freighters, shipments)
+
+    rows = session.execute(NEARBY_PENDING_SHIPMENTS, {
+        "scheduleids": [str(f["scheduleid"]) for f in freighters],
+        "radius_km": MATCH_RADIUS_KM,
+        "nearby_limit": NEARBY_LIMIT
+    })
+    return match_nearby(freighters, shipments, rows)
+
 def match_freighters_to_shipments():
     session = connect_db_sync()
     try:
@@ -34,51 +285,532 @@ def match_freighters_to_shipments():
         )
         shipments = result.scalars().all()
 
-        for freighter in freighters:
-            available_capacity = freighter.availablekg
-
-            # Filter and sort pending shipments by proximity to the freighter's departure location
-            pending_shipments = [s for s in shipments if s.status == "pending"]
-            pending_shipments.sort(
-                key=lambda s: haversine(freighter.departurelat, freighter.departurelng, s.originlat, s.originlng)
-            )
-
-            for shipment in pending_shipments:
-                if shipment.weightkg <= available_capacity:
-                    print("\n", "CREATING A MATCH!!!", "\n")
-
-                    # Create a match record in the shipment_matches table.
-                    match_record = ShipmentMatches(
-                        matchid=str(uuid.uuid4()),
-                        clientid=str(shipment.clientid),
-                        freighterid=str(freighter.freighterid),
-                        requestid=str(shipment.requestid),
-                        scheduleid=str(freighter.scheduleid),
-                        status="matched"  # or "pending" based on your workflow
-                    )
-                    session.add(match_record)
-
-                    # Update the shipment so that it won't be used again.
-                    shipment.status = "matched"
-
-                    # Deduct the shipment's weight from the available capacity.
-                    available_capacity -= float(shipment.weightkg)
-                    freighter.availablekg = float(available_capacity)
-                    freighter.arrivallat = float(shipment.destinationlat)
-                    freighter.arrivallng = float(shipment.destinationlng)
-                    freighter.status = "in transit"
-
-                    print("\n", freighter, shipment, "\n")
-
-                    # If the freighter is fully loaded, break out of the loop.
-                    if available_capacity <= 0:
-                        break
+        # Candidate rows carry naive LastUpdated values, comparable with the locked rows
+        freighter_rows = [freighter_candidate(model_row(f)) for f in freighters]
+        shipment_rows = [shipment_candidate(model_row(s)) for s in shipments]
+
+        matches = find_matches(session, freighter_rows, shipment_rows)
+
+        # Rows changed since they were read above are left for the next poll
+        matches, _, _ = lock_current_matches(session, freighter_rows, shipment_rows, matches)
+
+        if MATCH_PERSISTENCE == "bulk":
+            rows = match_rows(freighter_rows, shipment_rows, matches)
+            persist_matches_bulk(session, rows)
+            session.commit()
+            return [(row["scheduleid"], row["requestid"]) for row in rows]
+
+        matched = apply_matches(session, freighters, shipments, matches)
 
         session.commit()
+
+        return [(str(f.scheduleid), str(s.requestid)) for f, s in matched]
+    finally:
+        session.close()
+
+# ==============================
+# Incremental matching
+# ==============================
+
+MATCHER_MODE = env.get("matcher", {}).get("mode", "incremental")  # "incremental" or "poll"
+MATCH_PERSISTENCE = env.get("matcher", {}).get("persistence", "bulk")  # "bulk" or "orm"
+POLL_INTERVAL = env.get("matcher", {}).get("poll_interval", 3)
+MATCH_SCHEDULE = env.get("matcher", {}).get("schedule", "fixed_delay")  # poll mode: "fixed_delay" or "fixed_rate"
+MATCH_MIN_INTERVAL = env.get("matcher", {}).get("min_interval", 0.5)  # poll interval under a large backlog
+MATCH_IDLE_INTERVAL = env.get("matcher", {}).get("idle_interval", 15)  # poll interval while nothing is pending
+MATCH_BACKLOG_TARGET = env.get("matcher", {}).get("backlog_target", 100)  # pending shipments that halve the poll interval
+RESYNC_INTERVAL = env.get("matcher", {}).get("resync_interval", 300)
+MATCH_RADIUS_KM = env.get("matcher", {}).get("radius_km")  # None: every pending shipment is a candidate
+NEARBY_LIMIT = env.get("matcher", {}).get("nearby_limit", 50)  # candidates looked up per freighter
+MATCH_RETRIES = env.get("matcher", {}).get("retries", 3)  # immediate re-runs after a pass hit stale rows
+MATCH_ENGINE = env.get("matcher", {}).get("engine", "async")  # "async" (asyncpg pool) or "thread" (SQLAlchemy in a worker thread)
+
+# Candidate set (available freighters, pending shipments) kept in sync by
+# notify_schedule_change / notify_shipment_change.
+fleet = FleetState()
+match_wakeup = asyncio.Event()
+
+# One list per candidate load in flight. Changes applied while a load awaits
+# the database are recorded here and replayed over its result, so the load
+# cannot overwrite them with the older rows it read.
+change_logs = []
+
+def as_timestamp(value):
+    """
+    Naive timestamp comparable with the LastUpdated columns (TIMESTAMP without
+    time zone). Rows relayed between cluster workers arrive as ISO strings, and
+    the ORM may hand back the stored value tagged as UTC.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def freighter_candidate(schedule):
+    return {
+        "scheduleid": str(schedule["scheduleid"]),
+        "freighterid": schedule["freighterid"],
+        "status": schedule["status"],
+        "departurelat": float(schedule["departurelat"]),
+        "departurelng": float(schedule["departurelng"]),
+        "availablekg": float(schedule["availablekg"]),
+        "lastupdated": as_timestamp(schedule["lastupdated"])
+    }
+
+def shipment_candidate(shipment):
+    return {
+        "requestid": str(shipment["requestid"]),
+        "clientid": shipment["clientid"],
+        "status": shipment["status"],
+        "originlat": float(shipment["originlat"]),
+        "originlng": float(shipment["originlng"]),
+        "destinationlat": float(shipment["destinationlat"]),
+        "destinationlng": float(shipment["destinationlng"]),
+        "weightkg": float(shipment["weightkg"]),
+        "lastupdated": as_timestamp(shipment["lastupdated"])
+    }
+
+def is_older(candidate, row):
+    """Whether the candidate already held is a newer version than the written row."""
+    written = as_timestamp(row["lastupdated"])
+    return candidate is not None and written is not None and candidate["lastupdated"] > written
+
+def apply_change(state, kind, row):
+    """Apply a written schedule/shipment row to state; returns whether it became a candidate."""
+    if kind == "schedule":
+        if is_older(state.schedules.get(str(row["scheduleid"])), row):
+            return False
+        if row["status"] == "available":
+            state.upsert_schedule(freighter_candidate(row))
+            return True
+        state.remove_schedule(row["scheduleid"])
+        return False
+
+    if is_older(state.shipments.get(str(row["requestid"])), row):
+        return False
+    if row["status"] == "pending":
+        state.upsert_shipment(shipment_candidate(row))
+        return True
+    state.remove_shipment(row["requestid"])
+    return False
+
+def record_change(kind, row):
+    for changes in change_logs:
+        changes.append((kind, row))
+    if apply_change(fleet, kind, row):
+        match_wakeup.set()
+
+def notify_schedule_change(schedule):
+    """Called after a freighter schedule is written; wakes the matcher if it became a candidate."""
+    record_change("schedule", schedule)
+
+def notify_shipment_change(shipment):
+    """Called after a shipment request is written; wakes the matcher if it became a candidate."""
+    record_change("shipment", shipment)
+
+async def load_recording_changes(load):
+    """Await load() and return its result with the changes notified meanwhile."""
+    changes = []
+    change_logs.append(changes)
+    try:
+        return await load(), changes
+    finally:
+        change_logs.remove(changes)
+
+def select_match_candidates(session):
+    freighters = session.execute(
+        select(FreighterSchedules).where(FreighterSchedules.status == "available")
+    ).scalars().all()
+    shipments = session.execute(
+        select(ShipmentRequests).where(ShipmentRequests.status == "pending")
+    ).scalars().all()
+
+    return (
+        [freighter_candidate(model_row(f)) for f in freighters],
+        [shipment_candidate(model_row(s)) for s in shipments]
+    )
+
+def load_match_candidates():
+    """Full scan used to seed (and periodically resync) the candidate set."""
+    session = connect_db_sync()
+    try:
+        return select_match_candidates(session)
     finally:
         session.close()
 
-async def match_freighters_to_shipments_async():
-    while True:
-        await asyncio.to_thread(match_freighters_to_shipments)
-        await asyncio.sleep(3)
+def load_candidates_by_id(scheduleids, requestids):
+    """Re-read specific candidate rows, e.g. after a pass found them stale."""
+    session = connect_db_sync()
+    try:
+        freighters = session.execute(
+            select(FreighterSchedules).where(FreighterSchedules.scheduleid.in_(list(scheduleids)))
+        ).scalars().all()
+        shipments = session.execute(
+            select(ShipmentRequests).where(ShipmentRequests.requestid.in_(list(requestids)))
+        ).scalars().all()
+
+        return [model_row(f) for f in freighters], [model_row(s) for s in shipments]
+    finally:
+        session.close()
+
+def run_match_pass(session, freighters, shipments):
+    """
+    Match a snapshot of candidate rows and persist the result, loading only the
+    matched freighters and shipments from the database. Matches involving rows
+    written since the snapshot are not persisted. The caller commits.
+    Returns (matched (scheduleid, requestid) pairs, stale scheduleids, stale requestids).
+    """
+    matches = find_matches(session, freighters, shipments)
+
+    if not matches:
+        return [], set(), set()
+
+    matches, stale_schedules, stale_requests = lock_current_matches(session, freighters, shipments, matches)
+
+    if MATCH_PERSISTENCE == "bulk":
+        rows = match_rows(freighters, shipments, matches)
+        persist_matches_bulk(session, rows)
+        return [(row["scheduleid"], row["requestid"]) for row in rows], stale_schedules, stale_requests
+
+    schedule_ids = list({freighters[f]["scheduleid"] for f, _, _ in matches})
+    request_ids = list({shipments[s]["requestid"] for _, s, _ in matches})
+
+    schedules = {
+        str(f.scheduleid): f for f in session.execute(
+            select(FreighterSchedules).where(FreighterSchedules.scheduleid.in_(schedule_ids))
+        ).scalars()
+    }
+    requests = {
+        str(s.requestid): s for s in session.execute(
+            select(ShipmentRequests).where(ShipmentRequests.requestid.in_(request_ids))
+        ).scalars()
+    }
+
+    # Rows can disappear between the snapshot and this load; skip those matches.
+    matches = [
+        m for m in matches
+        if freighters[m[0]]["scheduleid"] in schedules and shipments[m[1]]["requestid"] in requests
+    ]
+
+    matched = apply_matches(
+        session,
+        [schedules.get(f["scheduleid"]) for f in freighters],
+        [requests.get(s["requestid"]) for s in shipments],
+        matches
+    )
+
+    return [(str(f.scheduleid), str(s.requestid)) for f, s in matched], stale_schedules, stale_requests
+
+def match_candidates(freighters, shipments):
+    """run_match_pass in its own session; runs in a worker thread with matcher.engine = "thread"."""
+    session = connect_db_sync()
+    try:
+        result = run_match_pass(session, freighters, shipments)
+        session.commit()
+        return result
+    finally:
+        session.close()
+
+# ==============================
+# Native async engine
+# ==============================
+
+# The same passes on the shared asyncpg pool: candidates are read as records
+# holding only the columns matching needs and every write is one set-based
+# statement, so a tick needs no second driver, worker thread or ORM objects.
+
+CANDIDATE_SCHEDULE_COLUMNS = "scheduleid, freighterid, status, departurelat, departurelng, availablekg, lastupdated"
+CANDIDATE_SHIPMENT_COLUMNS = (
+    "requestid, clientid, status, originlat, originlng, destinationlat, destinationlng, weightkg, lastupdated"
+)
+
+SELECT_CANDIDATE_SCHEDULES = f"SELECT {CANDIDATE_SCHEDULE_COLUMNS} FROM freighterschedules WHERE status = 'available'"
+SELECT_CANDIDATE_SHIPMENTS = f"SELECT {CANDIDATE_SHIPMENT_COLUMNS} FROM shipmentrequests WHERE status = 'pending'"
+SELECT_SCHEDULES_BY_ID = f"SELECT {CANDIDATE_SCHEDULE_COLUMNS} FROM freighterschedules WHERE scheduleid = ANY($1::uuid[])"
+SELECT_SHIPMENTS_BY_ID = f"SELECT {CANDIDATE_SHIPMENT_COLUMNS} FROM shipmentrequests WHERE requestid = ANY($1::uuid[])"
+
+MATCH_BACKLOG = """
+    SELECT CASE
+        WHEN EXISTS (SELECT 1 FROM freighterschedules WHERE status = 'available')
+        THEN (SELECT count(*) FROM shipmentrequests WHERE status = 'pending')
+        ELSE 0
+    END
+"""
+
+NEARBY_PENDING_SHIPMENTS_ASYNC = """
+    SELECT scheduleid, requestid
+    FROM nearby_pending_shipments_for_schedules($1::uuid[], $2, $3)
+"""
+
+LOCK_SCHEDULES_ASYNC = """
+    SELECT scheduleid, status, lastupdated FROM freighterschedules
+    WHERE scheduleid = ANY($1::uuid[])
+    ORDER BY scheduleid
+    FOR UPDATE
+"""
+
+LOCK_REQUESTS_ASYNC = """
+    SELECT requestid, status, lastupdated FROM shipmentrequests
+    WHERE requestid = ANY($1::uuid[])
+    ORDER BY requestid
+    FOR UPDATE
+"""
+
+# BULK_PERSIST_MATCHES with positional parameters
+BULK_PERSIST_MATCHES_ASYNC = """
+    WITH new_matches AS (
+        INSERT INTO shipmentmatches (matchid, clientid, freighterid, requestid, scheduleid, status)
+        SELECT m.matchid, m.clientid, m.freighterid, m.requestid, m.scheduleid, 'matched'
+        FROM unnest($1::uuid[], $2::uuid[], $3::uuid[], $4::uuid[], $5::uuid[])
+            AS m(matchid, clientid, freighterid, requestid, scheduleid)
+    ), matched_shipments AS (
+        UPDATE shipmentrequests
+        SET status = 'matched', lastupdated = bump_last_updated(lastupdated)
+        WHERE requestid = ANY($4::uuid[])
+    )
+    UPDATE freighterschedules AS f
+    SET availablekg = u.availablekg,
+        arrivallat = u.arrivallat,
+        arrivallng = u.arrivallng,
+        status = 'in transit',
+        lastupdated = bump_last_updated(f.lastupdated)
+    FROM unnest($6::uuid[], $7::numeric[], $8::double precision[], $9::double precision[])
+        AS u(scheduleid, availablekg, arrivallat, arrivallng)
+    WHERE f.scheduleid = u.scheduleid
+"""
+
+async def select_match_candidates_async(conn):
+    freighters = await conn.fetch(SELECT_CANDIDATE_SCHEDULES)
+    shipments = await conn.fetch(SELECT_CANDIDATE_SHIPMENTS)
+    return [freighter_candidate(f) for f in freighters], [shipment_candidate(s) for s in shipments]
+
+async def load_match_candidates_async():
+    async with acquire_db() as conn:
+        return await select_match_candidates_async(conn)
+
+async def load_candidates_by_id_async(scheduleids, requestids):
+    async with acquire_db() as conn:
+        freighters = await conn.fetch(SELECT_SCHEDULES_BY_ID, list(scheduleids))
+        shipments = await conn.fetch(SELECT_SHIPMENTS_BY_ID, list(requestids))
+        return freighters, shipments
+
+async def find_matches_async(conn, freighters, shipments):
+    """find_matches on an asyncpg connection."""
+    if MATCH_RADIUS_KM is not None:
+        rows = await conn.fetch(
+            NEARBY_PENDING_SHIPMENTS_ASYNC, [f["scheduleid"] for f in freighters], MATCH_RADIUS_KM, NEARBY_LIMIT
+        )
+        return match_nearby(freighters, shipments, rows)
+
+    # Passes bigger than one distance block (typically a resync after a backlog)
+    # are matched in a worker thread so they don't stall the event loop.
+    if len(freighters) * len(shipments) > MAX_MATRIX_CELLS:
+        return await asyncio.to_thread(match_all, freighters, shipments)
+    return match_all(freighters, shipments)
+
+async def lock_current_matches_async(conn, freighters, shipments, matches):
+    """lock_current_matches on an asyncpg connection; the caller holds the transaction."""
+    candidate_schedules, candidate_requests = matched_candidates(freighters, shipments, matches)
+
+    schedules = {
+        str(row["scheduleid"]): (row["status"], row["lastupdated"])
+        for row in await conn.fetch(LOCK_SCHEDULES_ASYNC, list(candidate_schedules))
+    }
+    requests = {
+        str(row["requestid"]): (row["status"], row["lastupdated"])
+        for row in await conn.fetch(LOCK_REQUESTS_ASYNC, list(candidate_requests))
+    }
+    return current_matches(freighters, shipments, matches, schedules, requests)
+
+async def persist_matches_bulk_async(conn, rows):
+    """persist_matches_bulk on an asyncpg connection."""
+    if not rows:
+        return
+
+    final_schedules = {row["scheduleid"]: row for row in rows}
+
+    await conn.execute(
+        BULK_PERSIST_MATCHES_ASYNC,
+        [row["matchid"] for row in rows],
+        [row["clientid"] for row in rows],
+        [row["freighterid"] for row in rows],
+        [row["requestid"] for row in rows],
+        [row["scheduleid"] for row in rows],
+        list(final_schedules),
+        [row["availablekg"] for row in final_schedules.values()],
+        [row["arrivallat"] for row in final_schedules.values()],
+        [row["arrivallng"] for row in final_schedules.values()]
+    )
+
+async def run_match_pass_async(conn, freighters, shipments):
+    """run_match_pass on an asyncpg connection; the caller holds the transaction."""
+    matches = await find_matches_async(conn, freighters, shipments)
+
+    if not matches:
+        return [], set(), set()
+
+    matches, stale_schedules, stale_requests = await lock_current_matches_async(conn, freighters, shipments, matches)
+
+    rows = match_rows(freighters, shipments, matches)
+    await persist_matches_bulk_async(conn, rows)
+    return [(row["scheduleid"], row["requestid"]) for row in rows], stale_schedules, stale_requests
+
+async def match_candidates_async(freighters, shipments):
+    async with acquire_db() as conn:
+        async with conn.transaction():
+            return await run_match_pass_async(conn, freighters, shipments)
+
+async def match_freighters_to_shipments_native():
+    """match_freighters_to_shipments (the poll-mode pass) in one transaction on the pool."""
+    async with acquire_db() as conn:
+        async with conn.transaction():
+            freighters, shipments = await select_match_candidates_async(conn)
+            matched, _, _ = await run_match_pass_async(conn, freighters, shipments)
+            return matched
+
+async def refresh_match_candidates(scheduleids, requestids):
+    """Replace stale candidates with their current rows (dropping those that stopped being candidates)."""
+    if MATCH_ENGINE == "async":
+        load = lambda: load_candidates_by_id_async(scheduleids, requestids)
+    else:
+        load = lambda: asyncio.to_thread(load_candidates_by_id, scheduleids, requestids)
+    (freighters, shipments), changes = await load_recording_changes(load)
+
+    for scheduleid in scheduleids:
+        fleet.remove_schedule(scheduleid)
+    for requestid in requestids:
+        fleet.remove_shipment(requestid)
+
+    for freighter in freighters:
+        if freighter["status"] == "available":
+            fleet.upsert_schedule(freighter_candidate(freighter))
+    for shipment in shipments:
+        if shipment["status"] == "pending":
+            fleet.upsert_shipment(shipment_candidate(shipment))
+
+    for kind, row in changes:
+        apply_change(fleet, kind, row)
+
+async def resync_match_candidates():
+    """Reload every candidate into a new FleetState and swap it in once it is complete."""
+    global fleet
+    if MATCH_ENGINE == "async":
+        load = load_match_candidates_async
+    else:
+        load = lambda: asyncio.to_thread(load_match_candidates)
+    (freighters, shipments), changes = await load_recording_changes(load)
+
+    state = FleetState()
+    for freighter in freighters:
+        state.upsert_schedule(freighter)
+    for shipment in shipments:
+        state.upsert_shipment(shipment)
+    for kind, row in changes:
+        apply_change(state, kind, row)
+    fleet = state
+
+# ==============================
+# Scheduled matcher jobs
+# ==============================
+
+def match_backlog():
+    """Pending shipments that could be matched right now (none without an available freighter)."""
+    if not fleet.schedule_ids_by_status.get("available"):
+        return 0
+    return len(fleet.request_ids_by_status.get("pending", ()))
+
+async def count_match_backlog():
+    """match_backlog() for poll mode, where the candidates only live in the database."""
+    async with acquire_db() as conn:
+        return await conn.fetchval(MATCH_BACKLOG)
+
+async def resync_and_wake():
+    await resync_match_candidates()
+    match_wakeup.set()
+
+async def incremental_match_pass(on_matched=None, retries=0):
+    """
+    One pass over the in-memory candidates. Returns the retry count for the
+    next pass: passes that hit rows changed concurrently reload them and wake
+    the matcher again right away, a bounded number of times; after that they
+    wait for the next change.
+    """
+    freighters = fleet.schedules_with_status("available")
+    shipments = fleet.shipments_with_status("pending")
+    if not freighters or not shipments:
+        return retries
+
+    start = time.perf_counter()
+    if MATCH_ENGINE == "async":
+        matched, stale_schedules, stale_requests = await match_candidates_async(freighters, shipments)
+    else:
+        matched, stale_schedules, stale_requests = await asyncio.to_thread(match_candidates, freighters, shipments)
+    elapsed = time.perf_counter() - start
+
+    observe_matcher_pass(elapsed, len(matched), len(stale_schedules), len(stale_requests))
+    log.debug(
+        "matcher pass", freighters=len(freighters), shipments=len(shipments), matches=len(matched),
+        duration_ms=round(elapsed * 1000, 1)
+    )
+
+    # Matched freighters are now in transit and matched shipments are no longer pending.
+    for scheduleid, requestid in matched:
+        fleet.remove_schedule(scheduleid)
+        fleet.remove_shipment(requestid)
+
+    if stale_schedules or stale_requests:
+        log.info("rows changed concurrently", schedules=len(stale_schedules), shipments=len(stale_requests), retry=retries + 1)
+        await refresh_match_candidates(stale_schedules, stale_requests)
+        retries += 1
+        if retries <= MATCH_RETRIES:
+            match_wakeup.set()
+    else:
+        retries = 0
+
+    if matched and on_matched:
+        await on_matched(matched)
+    return retries
+
+async def poll_match_pass(on_matched=None):
+    """One poll-mode pass: match everything currently in the database."""
+    start = time.perf_counter()
+    if MATCH_ENGINE == "async":
+        matched = await match_freighters_to_shipments_native()
+    else:
+        matched = await asyncio.to_thread(match_freighters_to_shipments)
+    observe_matcher_pass(time.perf_counter() - start, len(matched))
+
+    if matched and on_matched:
+        await on_matched(matched)
+
+def matcher_jobs(on_matched=None):
+    """
+    Scheduler jobs running the matcher. on_matched, if given, is awaited with
+    the (scheduleid, requestid) pairs written by each pass that matched anything.
+
+    incremental: a pass runs whenever a change wakes it up (skipped while
+    nothing is pending), and a second job reloads the candidate set every
+    RESYNC_INTERVAL seconds in case a change event went missing.
+    poll: a pass every POLL_INTERVAL seconds, sooner while the backlog is
+    large, and backing off to MATCH_IDLE_INTERVAL while nothing is pending.
+    """
+    if MATCHER_MODE == "incremental":
+        retries = 0
+
+        async def tick():
+            nonlocal retries
+            retries = await incremental_match_pass(on_matched, retries)
+
+        return [
+            Job("matcher-resync", resync_and_wake, interval=RESYNC_INTERVAL),
+            Job("matcher", tick, interval=RESYNC_INTERVAL, backlog=match_backlog, wakeup=match_wakeup)
+        ]
+
+    return [
+        Job(
+            "matcher", lambda: poll_match_pass(on_matched), interval=POLL_INTERVAL, mode=MATCH_SCHEDULE,
+            backlog=count_match_backlog, min_interval=MATCH_MIN_INTERVAL, max_interval=MATCH_IDLE_INTERVAL,
+            backlog_target=MATCH_BACKLOG_TARGET
+        )
+    ]
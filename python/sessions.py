@@ -0,0 +1,161 @@
+import time
+import uuid
+from abc import ABC, abstractmethod
+from startup import acquire_db, env
+
+SESSION_TTL = 30 * 60  # seconds, matches the fb_access_token cookie max_age
+EVICT_INTERVAL = 60
+
+
+class SessionStore(ABC):
+    """
+    Issued access tokens and the active-user set.
+
+    Both expire SESSION_TTL after they were written. Implementations must be
+    safe to share between uvicorn workers if they are used with --workers > 1.
+    """
+
+    @abstractmethod
+    async def put_token(self, userid, token):
+        ...
+
+    @abstractmethod
+    async def get_token(self, userid):
+        ...
+
+    @abstractmethod
+    async def add_active_user(self, user):
+        ...
+
+    @abstractmethod
+    async def remove_active_user(self, userid):
+        ...
+
+    @abstractmethod
+    async def is_active(self, userid):
+        ...
+
+    @abstractmethod
+    async def active_users(self):
+        ...
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store. Values are plain tuples; expired entries are swept at most once a minute."""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self.tokens = {}  # userid -> (token, expires_at)
+        self.active = {}  # userid -> (name, role, expires_at)
+        self.last_evict = time.monotonic()
+
+    def _evict(self):
+        now = time.monotonic()
+        if now - self.last_evict < EVICT_INTERVAL:
+            return
+        self.last_evict = now
+        self.tokens = {k: v for k, v in self.tokens.items() if v[1] > now}
+        self.active = {k: v for k, v in self.active.items() if v[2] > now}
+
+    async def put_token(self, userid, token):
+        self._evict()
+        self.tokens[userid] = (token, time.monotonic() + self.ttl)
+
+    async def get_token(self, userid):
+        entry = self.tokens.get(userid)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    async def add_active_user(self, user):
+        self._evict()
+        self.active[user.userid] = (user.name, user.role, time.monotonic() + self.ttl)
+
+    async def remove_active_user(self, userid):
+        self.active.pop(userid, None)
+
+    async def is_active(self, userid):
+        entry = self.active.get(userid)
+        return entry is not None and entry[2] > time.monotonic()
+
+    async def active_users(self):
+        now = time.monotonic()
+        return [
+            {"userid": userid, "name": name, "role": role}
+            for userid, (name, role, expires_at) in self.active.items()
+            if expires_at > now
+        ]
+
+
+class PostgresSessionStore(SessionStore):
+    """Shared store backed by the UNLOGGED Sessions table, so every worker sees the same state."""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self.last_evict = time.monotonic()
+
+    async def _evict(self, conn):
+        now = time.monotonic()
+        if now - self.last_evict < EVICT_INTERVAL:
+            return
+        self.last_evict = now
+        await conn.execute(
+            "DELETE FROM sessions WHERE COALESCE(tokenexpiresat, NOW()) <= NOW() AND COALESCE(activeexpiresat, NOW()) <= NOW()"
+        )
+
+    async def put_token(self, userid, token):
+        async with acquire_db() as conn:
+            await self._evict(conn)
+            await conn.execute(
+                """
+                    INSERT INTO sessions (userid, token, tokenexpiresat)
+                    VALUES ($1, $2, NOW() + make_interval(secs => $3))
+                    ON CONFLICT (userid) DO UPDATE
+                    SET token = EXCLUDED.token, tokenexpiresat = EXCLUDED.tokenexpiresat
+                """,
+                uuid.UUID(userid), token, self.ttl
+            )
+
+    async def get_token(self, userid):
+        async with acquire_db() as conn:
+            return await conn.fetchval(
+                "SELECT token FROM sessions WHERE userid = $1 AND tokenexpiresat > NOW()",
+                uuid.UUID(userid)
+            )
+
+    async def add_active_user(self, user):
+        async with acquire_db() as conn:
+            await self._evict(conn)
+            await conn.execute(
+                """
+                    INSERT INTO sessions (userid, name, role, activeexpiresat)
+                    VALUES ($1, $2, $3, NOW() + make_interval(secs => $4))
+                    ON CONFLICT (userid) DO UPDATE
+                    SET name = EXCLUDED.name, role = EXCLUDED.role, activeexpiresat = EXCLUDED.activeexpiresat
+                """,
+                uuid.UUID(user.userid), user.name, user.role, self.ttl
+            )
+
+    async def remove_active_user(self, userid):
+        async with acquire_db() as conn:
+            await conn.execute("UPDATE sessions SET activeexpiresat = NULL WHERE userid = $1", uuid.UUID(userid))
+
+    async def is_active(self, userid):
+        async with acquire_db() as conn:
+            return await conn.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM sessions WHERE userid = $1 AND activeexpiresat > NOW())",
+                uuid.UUID(userid)
+            )
+
+    async def active_users(self):
+        async with acquire_db() as conn:
+            rows = await conn.fetch("SELECT userid, name, role FROM sessions WHERE activeexpiresat > NOW()")
+        return [{"userid": str(r["userid"]), "name": r["name"], "role": r["role"]} for r in rows]
+
+
+def create_session_store():
+    backend = env.get("sessions", {}).get("backend", "memory")  # "memory" or "postgres"
+    # Workers in cluster mode must share session state
+    if backend == "postgres" or env.get("cluster", {}).get("enabled", False):
+        return PostgresSessionStore()
+    return InMemorySessionStore()
@@ -0,0 +1 @@
+python startup.py && python -m uvicorn index:app --workers ${WORKERS:-4} --log-level warning
@@ -1,10 +1,16 @@
+import asyncio
 import asyncpg
 import os
 import json
+import time
 # startup.py
 import os
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from statements import TimedConnection
+from logs import configure_logging, get_logger
+from metrics import instrument_engine
 
 env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "env.json"))
 schemas_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "schemas.sql"))
@@ -12,6 +18,10 @@ stored_procedure_directory = os.path.abspath(os.path.join(os.path.dirname(__file
 with open(env_path, 'r') as file:
     env = json.load(file)
 
+# logging.level: DEBUG shows the per-match / per-truck messages; logging.format: "text" or "json"
+configure_logging(env.get("logging", {}).get("level", "INFO"), env.get("logging", {}).get("format", "text"))
+log = get_logger("startup")
+
 async def connect_db():
     return await asyncpg.connect(
         user=env["db"]["username"],
@@ -22,14 +32,107 @@ async def connect_db():
     )
 
 
+# ==============================
+# Connection pool
+# ==============================
+
+POOL_MIN_SIZE = env["db"].get("pool_min_size", 5)
+POOL_MAX_SIZE = env["db"].get("pool_max_size", 20)
+POOL_ACQUIRE_TIMEOUT = env["db"].get("pool_acquire_timeout", 10.0)
+POOL_STATEMENT_CACHE_SIZE = env["db"].get("statement_cache_size", 100)  # prepared statements kept per connection, see statements.Statement
+
+db_pool = None
+
+pool_wait_stats = {
+    "acquired": 0,
+    "timeouts": 0,
+    "wait_total_ms": 0.0,
+    "wait_max_ms": 0.0
+}
+
+async def create_db_pool():
+    global db_pool
+    if db_pool is None:
+        db_pool = await asyncpg.create_pool(
+            user=env["db"]["username"],
+            port=env["db"]["port"],
+            password=env["db"]["password"],
+            database=env["db"]["database"],
+            host=env["db"]["host"],
+            min_size=POOL_MIN_SIZE,
+            max_size=POOL_MAX_SIZE,
+            statement_cache_size=POOL_STATEMENT_CACHE_SIZE,
+            connection_class=TimedConnection
+        )
+    return db_pool
+
+async def close_db_pool():
+    global db_pool
+    if db_pool is not None:
+        await db_pool.close()
+        db_pool = None
+
+@asynccontextmanager
+async def acquire_db():
+    """
+    Borrow a connection from the shared pool for the duration of the block.
+    Falls back to a one-off connection when the pool hasn't been created
+    (e.g. scripts that import this module outside of the app lifespan).
+    """
+    if db_pool is None:
+        conn = await connect_db()
+        try:
+            yield conn
+        finally:
+            await conn.close()
+        return
+
+    start = time.perf_counter()
+    try:
+        conn = await db_pool.acquire(timeout=POOL_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        pool_wait_stats["timeouts"] += 1
+        raise
+
+    waited_ms = (time.perf_counter() - start) * 1000
+    pool_wait_stats["acquired"] += 1
+    pool_wait_stats["wait_total_ms"] += waited_ms
+    pool_wait_stats["wait_max_ms"] = max(pool_wait_stats["wait_max_ms"], waited_ms)
+
+    try:
+        yield conn
+    finally:
+        await db_pool.release(conn)
+
+def db_pool_stats():
+    acquired = pool_wait_stats["acquired"]
+    stats = {
+        "min_size": POOL_MIN_SIZE,
+        "max_size": POOL_MAX_SIZE,
+        "size": 0,
+        "in_use": 0,
+        "idle": 0,
+        "acquired": acquired,
+        "timeouts": pool_wait_stats["timeouts"],
+        "wait_avg_ms": pool_wait_stats["wait_total_ms"] / acquired if acquired else 0.0,
+        "wait_max_ms": pool_wait_stats["wait_max_ms"]
+    }
+    if db_pool is not None:
+        stats["size"] = db_pool.get_size()
+        stats["idle"] = db_pool.get_idle_size()
+        stats["in_use"] = stats["size"] - stats["idle"]
+    return stats
+
+
 DATABASE_URL = (
     f"postgresql://{env["db"]["username"]}:{env["db"]["password"]}"
     f"@{env["db"]["host"]}:{env["db"]["port"]}/{env["db"]["database"]}"
 )
 
-print(DATABASE_URL)
+log.debug("database", host=env["db"]["host"], port=env["db"]["port"], database=env["db"]["database"])
 
 sync_engine = create_engine(DATABASE_URL, echo=False)
+instrument_engine(sync_engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 
 def connect_db_sync():
@@ -47,9 +150,9 @@ async def load_stored_procedures():
             await conn.execute("DELETE FROM freighterschedules WHERE 1 = 1")
             await conn.execute("DELETE FROM shipmentmatches WHERE 1 = 1")
             await conn.execute(schemas_sql.read().strip())
-            print(f"Executed: {schemas_path}")
+            log.debug("executed", file=schemas_path)
     	except Exception as e:
-    		print(f"Error processing schemas.sql, {e}")
+    		log.error("error processing schemas.sql", error=e)
     
     for file_name in os.listdir(stored_procedure_directory):
         file_path = os.path.join(stored_procedure_directory, file_name)
@@ -59,8 +162,13 @@ async def load_stored_procedures():
                 sql_content = sql_file.read().strip()
                 try:
                     await conn.execute(sql_content)
-                    print(f"Executed: {file_name}")
+                    log.debug("executed", file=file_name)
                 except Exception as e:
-                    print(f"Error executing {file_name}: {e}")
+                    log.error("error executing stored procedure file", file=file_name, error=e)
+
+    await conn.close()
+
 
-    await conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    # One-off schema load; cluster mode runs this before starting the workers
+    asyncio.run(load_stored_procedures())
@@ -0,0 +1,134 @@
+import time
+import asyncpg
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from metrics import observe_query, command_rows
+
+
+class TimedConnection(asyncpg.Connection):
+    """
+    asyncpg connection whose queries are timed into metrics.query_stats with
+    their row counts.
+    """
+
+    async def _timed(self, query, call, count_rows):
+        start = time.perf_counter()
+        try:
+            result = await call
+        except Exception:
+            observe_query(query, time.perf_counter() - start, 0, error=True)
+            raise
+        observe_query(query, time.perf_counter() - start, count_rows(result))
+        return result
+
+    async def fetch(self, query, *args, **kwargs):
+        return await self._timed(query, super().fetch(query, *args, **kwargs), len)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        return await self._timed(query, super().fetchrow(query, *args, **kwargs), lambda row: int(row is not None))
+
+    async def fetchval(self, query, *args, **kwargs):
+        return await self._timed(query, super().fetchval(query, *args, **kwargs), lambda value: int(value is not None))
+
+    async def execute(self, query, *args, **kwargs):
+        return await self._timed(query, super().execute(query, *args, **kwargs), command_rows)
+
+
+class Statement:
+    """
+    A registered stored-procedure call with its call count and latency.
+
+    Each connection prepares the call on its first fetch() and keeps it in
+    its asyncpg statement cache (db.statement_cache_size), which survives
+    pool acquire/release, so later calls skip the parse and plan.
+    """
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    async def fetch(self, conn, *args):
+        start = time.perf_counter()
+        try:
+            return await conn.fetch(self.sql, *args)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.calls += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "max_ms": self.max_ms
+        }
+
+
+statements = {}
+
+def register(name, sql):
+    statements[name] = Statement(name, sql)
+    return statements[name]
+
+GET_USER_BY_NAME = register("get_user_by_name", "SELECT * FROM get_user_by_name($1)")
+INSERT_USER = register("insert_user", "SELECT userid, name, role, email FROM insert_user($1, $2, $3, $4)")
+INSERT_USER_WITH_ID = register("insert_user_with_id", "SELECT * FROM insert_user_with_id($1, $2, $3, $4, $5)")
+GET_ALL_FREIGHTER_SCHEDULES = register("get_all_freighter_schedules", "SELECT * FROM get_all_freighter_schedules()")
+UPSERT_FREIGHTER_SCHEDULE = register(
+    "upsert_freighter_schedule",
+    "SELECT * FROM upsert_freighter_schedule($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)"
+)
+UPSERT_SHIPMENT_REQUEST = register(
+    "upsert_shipment_request",
+    "SELECT * FROM upsert_shipment_request($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)"
+)
+
+
+def statement_stats():
+    return {name: statement.stats() for name, statement in statements.items()}
+
+
+# Typed callables for the stored procedures
+
+async def get_user_by_name(conn, name: str):
+    return await GET_USER_BY_NAME.fetch(conn, name)
+
+async def insert_user(conn, name: str, email: str, password_hash: str, role: str):
+    return await INSERT_USER.fetch(conn, name, email, password_hash, role)
+
+async def insert_user_with_id(conn, userid: UUID, name: str, email: str, password_hash: str, role: str):
+    return await INSERT_USER_WITH_ID.fetch(conn, userid, name, email, password_hash, role)
+
+async def get_all_freighter_schedules(conn):
+    return await GET_ALL_FREIGHTER_SCHEDULES.fetch(conn)
+
+async def upsert_freighter_schedule(
+    conn, freighterid: UUID, departurecity: Optional[str], departurelat: float, departurelng: float,
+    arrivalcity: Optional[str], arrivallat: Optional[float], arrivallng: Optional[float],
+    departuredate: Optional[datetime], arrivaldate: Optional[datetime],
+    maxloadkg: float, availablekg: float, status: str, expected_lastupdated: Optional[datetime] = None
+):
+    return await UPSERT_FREIGHTER_SCHEDULE.fetch(
+        conn, freighterid, departurecity, departurelat, departurelng, arrivalcity, arrivallat, arrivallng,
+        departuredate, arrivaldate, maxloadkg, availablekg, status, expected_lastupdated
+    )
+
+async def upsert_shipment_request(
+    conn, requestid: UUID, clientid: UUID, origincity: Optional[str], originlat: float, originlng: float,
+    destinationcity: Optional[str], destinationlat: float, destinationlng: float,
+    weightkg: float, specialhandling: Optional[str], status: str, expected_lastupdated: Optional[datetime] = None
+):
+    return await UPSERT_SHIPMENT_REQUEST.fetch(
+        conn, requestid, clientid, origincity, originlat, originlng,
+        destinationcity, destinationlat, destinationlng, weightkg, specialhandling, status, expected_lastupdated
+    )
@@ -0,0 +1,32 @@
+import os
+import sys
+import asyncio
+import pytest
+
+PYTHON_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PYTHON_DIR)
+
+# Modules importing startup read env.json when they are imported; without it
+# only the tests of the standalone modules run.
+ENV_PATH = os.path.join(PYTHON_DIR, "..", "env.json")
+collect_ignore = [] if os.path.exists(ENV_PATH) else ["test_scheduler.py", "test_concurrency.py", "test_matcher.py"]
+
+
+async def database_ready():
+    from startup import connect_db
+
+    try:
+        conn = await connect_db()
+    except Exception:
+        return False
+    try:
+        return await conn.fetchval("SELECT to_regproc('upsert_freighter_schedule') IS NOT NULL")
+    finally:
+        await conn.close()
+
+
+@pytest.fixture(scope="module")
+def require_database():
+    """Skip tests needing the database from env.json with schemas.sql and the stored procedures loaded."""
+    if not asyncio.run(database_ready()):
+        pytest.skip("database from env.json is not reachable or its schema is not loaded")
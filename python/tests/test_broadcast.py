@@ -0,0 +1,35 @@
+from broadcast import BroadcastClient
+
+
+def queued(client):
+    return [message for message, _ in client.queue]
+
+
+def test_full_queue_drops_the_oldest_droppable_message():
+    client = BroadcastClient(None, 3)
+    client.offer("snapshot", droppable=False)
+    for message in ("a", "b", "c"):
+        client.offer(message)
+
+    assert queued(client) == ["snapshot", "b", "c"]
+    assert client.dropped == 1
+
+
+def test_new_snapshot_replaces_a_queued_one():
+    client = BroadcastClient(None, 3)
+    client.offer("snapshot 1", droppable=False)
+    client.offer("a")
+    client.offer("snapshot 2", droppable=False)
+
+    assert queued(client) == ["a", "snapshot 2"]
+    assert client.dropped == 1
+
+
+def test_repeated_snapshots_stay_within_the_bound():
+    client = BroadcastClient(None, 2)
+    for i in range(100):
+        client.offer(f"snapshot {i}", droppable=False)
+        client.offer(f"update {i}")
+
+    assert len(client.queue) <= 2
+    assert queued(client) == ["snapshot 99", "update 99"]
@@ -0,0 +1,105 @@
+"""
+Compare-and-swap writes through the API: a write carrying a stale
+expected_lastupdated gets a 409 and leaves the row alone.
+
+Needs the database from env.json with schemas.sql and the stored procedures
+loaded (python startup.py); skipped otherwise. The rows it writes are
+deleted afterwards.
+"""
+import uuid
+import asyncio
+import httpx
+import pytest
+from startup import connect_db, create_db_pool, close_db_pool
+
+pytestmark = pytest.mark.usefixtures("require_database")
+
+
+def run_with_api(scenario):
+    """Run scenario(client, conn, userid) against the app with a throwaway user, then delete what it wrote."""
+    import index
+
+    async def main():
+        conn = await connect_db()
+        userid = await conn.fetchval(
+            "INSERT INTO users (name, email, passwordhash, role) VALUES ($1, $1, 'x', 'Freighter') RETURNING userid",
+            f"cas-test-{uuid.uuid4()}"
+        )
+        await create_db_pool()
+        try:
+            transport = httpx.ASGITransport(app=index.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await scenario(client, conn, userid)
+        finally:
+            await close_db_pool()
+            await conn.execute("DELETE FROM freighterschedules WHERE freighterid = $1", userid)
+            await conn.execute("DELETE FROM shipmentrequests WHERE clientid = $1", userid)
+            await conn.execute("DELETE FROM users WHERE userid = $1", userid)
+            await conn.close()
+
+    asyncio.run(main())
+
+
+def schedule_body(userid, lat, **fields):
+    return {
+        "freighterid": str(userid), "departurecity": "Test", "departurelat": lat, "departurelng": -90.0,
+        "arrivalcity": None, "arrivallat": None, "arrivallng": None, "departuredate": None, "arrivaldate": None,
+        "maxloadkg": 1000, "availablekg": 1000, "status": "available", **fields
+    }
+
+
+def shipment_body(requestid, userid, weight, **fields):
+    return {
+        "requestid": requestid, "clientid": str(userid), "origincity": "Origin", "originlat": 40.0, "originlng": -90.0,
+        "destinationcity": "Destination", "destinationlat": 41.0, "destinationlng": -91.0, "weightkg": weight,
+        "specialhandling": None, "status": "pending", **fields
+    }
+
+
+def test_stale_schedule_write_conflicts():
+    async def scenario(client, conn, userid):
+        created = await client.post("/freighters/schedules", json=schedule_body(userid, 40.0))
+        assert created.status_code == 200
+        first = created.json()["lastupdated"]
+
+        updated = await client.post("/freighters/schedules", json=schedule_body(userid, 41.0, expected_lastupdated=first))
+        assert updated.status_code == 200
+        second = updated.json()["lastupdated"]
+        assert second > first
+
+        stale = await client.post("/freighters/schedules", json=schedule_body(userid, 42.0, expected_lastupdated=first))
+        assert stale.status_code == 409
+        assert "modified concurrently" in stale.json()["detail"]
+
+        row = await conn.fetchrow("SELECT departurelat, lastupdated FROM freighterschedules WHERE freighterid = $1", userid)
+        assert float(row["departurelat"]) == 41.0
+        assert row["lastupdated"].isoformat() == second
+
+    run_with_api(scenario)
+
+
+def test_malformed_expected_lastupdated_is_rejected():
+    async def scenario(client, conn, userid):
+        response = await client.post("/freighters/schedules", json=schedule_body(userid, 40.0, expected_lastupdated="yesterday"))
+        assert response.status_code == 400
+
+    run_with_api(scenario)
+
+
+def test_stale_shipment_write_conflicts():
+    async def scenario(client, conn, userid):
+        requestid = str(uuid.uuid4())
+        created = await client.post("/shipments/requests", json=shipment_body(requestid, userid, 500))
+        assert created.status_code == 200
+        first = created.json()["lastupdated"]
+
+        updated = await client.post("/shipments/requests", json=shipment_body(requestid, userid, 600, expected_lastupdated=first))
+        assert updated.status_code == 200
+
+        stale = await client.post("/shipments/requests", json=shipment_body(requestid, userid, 700, expected_lastupdated=first))
+        assert stale.status_code == 409
+
+        weight = await conn.fetchval("SELECT weightkg FROM shipmentrequests WHERE requestid = $1", uuid.UUID(requestid))
+        assert float(weight) == 600
+
+    run_with_api(scenario)
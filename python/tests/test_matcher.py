@@ -0,0 +1,90 @@
+"""
+Poll-mode matcher passes against the database: the matches a pass finds are
+persisted, in both persistence modes.
+
+Needs the database from env.json with schemas.sql and the stored procedures
+loaded (python startup.py); skipped otherwise. Each test runs inside a
+transaction that is rolled back, so nothing it writes or matches is kept.
+"""
+import uuid
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import service
+from startup import sync_engine
+
+pytestmark = pytest.mark.usefixtures("require_database")
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """Session the matcher's commits land in as savepoints of a transaction rolled back afterwards."""
+    connection = sync_engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    monkeypatch.setattr(service, "connect_db_sync", lambda: session)
+    monkeypatch.setattr(service, "MATCH_RADIUS_KM", None)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def add_user(session, role):
+    return session.execute(
+        text("INSERT INTO users (name, email, passwordhash, role) VALUES (:name, :name, 'x', :role) RETURNING userid"),
+        {"name": f"matcher-test-{uuid.uuid4()}", "role": role}
+    ).scalar()
+
+
+def seed(session):
+    """A freighter with room for four shipments next to it, as the only candidates of the pass."""
+    # Other candidates would compete for the test's rows; the rollback restores them
+    session.execute(text("UPDATE freighterschedules SET status = 'completed' WHERE status = 'available'"))
+    session.execute(text("UPDATE shipmentrequests SET status = 'completed' WHERE status = 'pending'"))
+
+    freighterid = add_user(session, "Freighter")
+    clientid = add_user(session, "Supplier")
+    scheduleid = session.execute(text("""
+        INSERT INTO freighterschedules (freighterid, departurecity, departurelat, departurelng, maxloadkg, availablekg, status)
+        VALUES (:freighterid, 'Test', -85.0, 0.0, 1000, 1000, 'available')
+        RETURNING scheduleid
+    """), {"freighterid": freighterid}).scalar()
+    requestids = [
+        session.execute(text("""
+            INSERT INTO shipmentrequests (clientid, origincity, originlat, originlng, destinationcity, destinationlat, destinationlng, weightkg, status)
+            VALUES (:clientid, 'Origin', :lat, 0.0, 'Destination', -84.0, 1.0, 200, 'pending')
+            RETURNING requestid
+        """), {"clientid": clientid, "lat": -85.0 + i * 0.01}).scalar()
+        for i in range(4)
+    ]
+    session.commit()
+    return str(scheduleid), [str(requestid) for requestid in requestids]
+
+
+@pytest.mark.parametrize("persistence", ["bulk", "orm"])
+def test_poll_pass_persists_matches(session, monkeypatch, persistence):
+    monkeypatch.setattr(service, "MATCH_PERSISTENCE", persistence)
+    scheduleid, requestids = seed(session)
+
+    matched = service.match_freighters_to_shipments()
+
+    assert {(scheduleid, requestid) for requestid in requestids} <= set(matched)
+
+    statuses = session.execute(
+        text("SELECT status FROM shipmentrequests WHERE requestid = ANY(CAST(:ids AS uuid[]))"), {"ids": requestids}
+    ).scalars().all()
+    assert statuses == ["matched"] * 4
+
+    schedule = session.execute(
+        text("SELECT status, availablekg FROM freighterschedules WHERE scheduleid = :id"), {"id": scheduleid}
+    ).one()
+    assert schedule.status == "in transit"
+    assert float(schedule.availablekg) == 200
+
+    persisted = session.execute(
+        text("SELECT count(*) FROM shipmentmatches WHERE scheduleid = :id"), {"id": scheduleid}
+    ).scalar()
+    assert persisted == 4
@@ -0,0 +1,82 @@
+import math
+import random
+import numpy as np
+import pytest
+from matching import greedy_match, greedy_match_candidates, haversine_matrix
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def reference_match(freighters, shipments):
+    """The per-freighter sort greedy_match replaced."""
+    pending = set(range(len(shipments)))
+    matches = []
+    for f, (lat, lng, capacity) in enumerate(freighters):
+        for s in sorted(pending, key=lambda s: (haversine(lat, lng, shipments[s][0], shipments[s][1]), s)):
+            if shipments[s][2] <= capacity:
+                pending.discard(s)
+                capacity -= shipments[s][2]
+                matches.append((f, s, capacity))
+    return matches
+
+
+def run(freighters, shipments, **kwargs):
+    return greedy_match(
+        [f[0] for f in freighters], [f[1] for f in freighters], [f[2] for f in freighters],
+        [s[0] for s in shipments], [s[1] for s in shipments], [s[2] for s in shipments],
+        **kwargs
+    )
+
+
+def test_nearest_shipments_first():
+    freighters = [(40.0, -90.0, 200)]
+    shipments = [(45.0, -90.0, 100), (40.1, -90.0, 100), (42.0, -90.0, 100)]
+    assert run(freighters, shipments) == [(0, 1, 100.0), (0, 2, 0.0)]
+
+
+def test_skips_shipments_that_do_not_fit():
+    freighters = [(40.0, -90.0, 150)]
+    shipments = [(40.1, -90.0, 200), (41.0, -90.0, 100), (42.0, -90.0, 60)]
+    assert run(freighters, shipments) == [(0, 1, 50.0)]
+
+
+def test_freighters_take_turns_in_input_order():
+    freighters = [(41.0, -90.0, 100), (40.0, -90.0, 100)]
+    shipments = [(40.1, -90.0, 100), (45.0, -90.0, 100)]
+    # Freighter 1 is nearer to shipment 0, but freighter 0 picks first
+    assert run(freighters, shipments) == [(0, 0, 0.0), (1, 1, 0.0)]
+
+
+def test_empty_inputs():
+    assert run([], [(40.0, -90.0, 1)]) == []
+    assert run([(40.0, -90.0, 1)], []) == []
+
+
+@pytest.mark.parametrize("max_matrix_cells", [1, 37, 4_000_000])
+def test_matches_reference_in_any_chunk_size(max_matrix_cells):
+    rng = random.Random(7)
+    freighters = [(rng.uniform(25, 49), rng.uniform(-124, -67), rng.choice([500, 2000, 25000])) for _ in range(40)]
+    shipments = [(rng.uniform(25, 49), rng.uniform(-124, -67), rng.uniform(100, 3000)) for _ in range(120)]
+
+    result = run(freighters, shipments, max_matrix_cells=max_matrix_cells)
+    expected = reference_match(freighters, shipments)
+
+    assert [(f, s) for f, s, _ in result] == [(f, s) for f, s, _ in expected]
+    assert [c for _, _, c in result] == pytest.approx([c for _, _, c in expected])
+
+
+def test_candidate_lists_give_the_same_matches():
+    rng = random.Random(11)
+    freighters = [(rng.uniform(25, 49), rng.uniform(-124, -67), 5000) for _ in range(10)]
+    shipments = [(rng.uniform(25, 49), rng.uniform(-124, -67), rng.uniform(100, 3000)) for _ in range(30)]
+
+    distances = haversine_matrix(
+        [f[0] for f in freighters], [f[1] for f in freighters], [s[0] for s in shipments], [s[1] for s in shipments]
+    )
+    candidates = [np.argsort(row, kind="stable").tolist() for row in distances]
+
+    assert greedy_match_candidates([f[2] for f in freighters], [s[2] for s in shipments], candidates) == run(freighters, shipments)
@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from pagination import encode_cursor, decode_cursor, next_cursor, parse_bbox, page_query
+
+
+def make_rows(n):
+    start = datetime(2026, 1, 1)
+    return [{"createdat": start + timedelta(seconds=i), "requestid": uuid.uuid4()} for i in range(n)]
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2026, 3, 4, 5, 6, 7, 890123)
+    row_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(timestamp, row_id)) == (timestamp, row_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_cursor(datetime(2026, 1, 1), "not-a-uuid")])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_next_cursor_points_at_last_row_of_full_page():
+    rows = make_rows(3)
+    cursor = next_cursor(rows, 3, "createdat", "requestid")
+    assert decode_cursor(cursor) == (rows[-1]["createdat"], rows[-1]["requestid"])
+
+
+def test_next_cursor_ends_on_short_page():
+    assert next_cursor(make_rows(2), 3, "createdat", "requestid") is None
+    assert next_cursor([], 3, "createdat", "requestid") is None
+
+
+def test_next_cursor_without_limit():
+    assert next_cursor(make_rows(3), None, "createdat", "requestid") is None
+
+
+def test_parse_bbox():
+    assert parse_bbox(None, None, None, None) is None
+    assert parse_bbox(30.0, -100.0, 40.0, -90.0) == (30.0, -100.0, 40.0, -90.0)
+
+
+@pytest.mark.parametrize("bounds", [(30.0, None, None, None), (30.0, -100.0, 40.0, None), (None, -100.0, 40.0, -90.0)])
+def test_parse_bbox_requires_all_bounds(bounds):
+    with pytest.raises(HTTPException) as error:
+        parse_bbox(*bounds)
+    assert error.value.status_code == 400
+
+
+def test_page_query_numbers_arguments_in_order():
+    rows = make_rows(1)
+    cursor = encode_cursor(rows[0]["createdat"], rows[0]["requestid"])
+    sql, args = page_query(
+        "shipmentrequests", "createdat", "requestid",
+        filters={"status": "pending", "clientid": None},
+        bbox_columns=("originlat", "originlng"), bbox=(30.0, -100.0, 40.0, -90.0),
+        cursor=cursor, limit=50
+    )
+
+    assert sql == (
+        "SELECT * FROM shipmentrequests WHERE status = $1"
+        " AND originlat BETWEEN $2 AND $4 AND originlng BETWEEN $3 AND $5"
+        " AND (createdat, requestid) > ($6, $7)"
+        " ORDER BY createdat, requestid LIMIT $8"
+    )
+    assert args == ["pending", 30.0, -100.0, 40.0, -90.0, rows[0]["createdat"], rows[0]["requestid"], 50]
+
+
+def test_page_query_without_limit_is_unpaged():
+    assert page_query("shipmentrequests", "createdat", "requestid") == ("SELECT * FROM shipmentrequests", [])
@@ -0,0 +1,184 @@
+import time
+import asyncio
+import pytest
+import scheduler
+from scheduler import Job, JobScheduler, FIXED_RATE, FIXED_DELAY
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: 1.0)
+    monkeypatch.setattr(scheduler, "RESTART_DELAY", 0.02)
+
+
+def run_job(job, seconds):
+    async def main():
+        job.start()
+        await asyncio.sleep(seconds)
+        await job.stop()
+    asyncio.run(main())
+
+
+def recorder(duration=0.0, fail=lambda n: False):
+    """Tick function recording its start times; fail(n) decides whether tick n raises."""
+    starts = []
+
+    async def tick():
+        starts.append(time.monotonic())
+        if fail(len(starts)):
+            raise RuntimeError("tick failed")
+        await asyncio.sleep(duration)
+
+    return tick, starts
+
+
+def gaps(starts):
+    return [b - a for a, b in zip(starts, starts[1:])]
+
+
+def test_fixed_delay_waits_after_each_tick():
+    tick, starts = recorder(duration=0.05)
+    run_job(Job("delay", tick, interval=0.05, mode=FIXED_DELAY), 0.38)
+
+    assert len(starts) >= 3
+    assert all(gap >= 0.1 for gap in gaps(starts))
+
+
+def test_fixed_rate_keeps_the_cadence():
+    tick, starts = recorder(duration=0.03)
+    run_job(Job("rate", tick, interval=0.1, mode=FIXED_RATE), 0.45)
+
+    assert len(starts) >= 4
+    assert all(gap == pytest.approx(0.1, abs=0.03) for gap in gaps(starts))
+
+
+def test_fixed_rate_skips_overrun_ticks():
+    starts = []
+
+    async def tick():
+        starts.append(time.monotonic())
+        await asyncio.sleep(0.25 if len(starts) == 1 else 0.0)
+
+    job = Job("overrun", tick, interval=0.1, mode=FIXED_RATE)
+    run_job(job, 0.45)
+
+    stats = job.stats()
+    assert stats["overruns"] == 1
+    assert stats["missed_ticks"] == 2
+    # The slot after the overrun, not a burst of catch-up ticks
+    assert gaps(starts)[0] == pytest.approx(0.3, abs=0.03)
+
+
+def test_failures_back_off_exponentially_and_keep_the_job_alive():
+    tick, starts = recorder(fail=lambda n: n <= 3)
+    job = Job("flaky", tick, interval=0.05)
+    run_job(job, 0.3)
+
+    stats = job.stats()
+    assert stats["failures"] == 3
+    assert stats["consecutive_failures"] == 0
+    assert stats["runs"] >= 1
+    assert "tick failed" in stats["last_error"]
+    # RESTART_DELAY doubling per consecutive failure
+    assert gaps(starts)[:3] == pytest.approx([0.02, 0.04, 0.08], abs=0.015)
+
+
+def test_restart_delay_is_jittered_and_capped(monkeypatch):
+    factors = []
+    monkeypatch.setattr(scheduler.random, "uniform", lambda low, high: factors.append((low, high)) or high)
+    monkeypatch.setattr(scheduler, "MAX_RESTART_DELAY", 0.04)
+    tick, starts = recorder(fail=lambda n: True)
+    run_job(Job("broken", tick, interval=0.01), 0.3)
+
+    assert factors and all(factor == (0.5, 1.5) for factor in factors)
+    # 0.02 * 1.5, then capped at 0.04 * 1.5
+    assert gaps(starts)[0] == pytest.approx(0.03, abs=0.015)
+    assert all(gap == pytest.approx(0.06, abs=0.02) for gap in gaps(starts)[1:])
+
+
+def test_idle_backlog_skips_the_tick():
+    tick, starts = recorder()
+    job = Job("idle", tick, interval=0.05, backlog=lambda: 0, max_interval=0.05)
+    run_job(job, 0.2)
+
+    assert starts == []
+    assert job.stats()["idle_skips"] >= 3
+    assert job.stats()["interval_s"] == 0.05
+
+
+def test_async_backlog_is_awaited():
+    async def backlog():
+        return 5
+
+    tick, starts = recorder()
+    job = Job("busy", tick, interval=0.05, backlog=backlog)
+    run_job(job, 0.12)
+
+    assert starts
+    assert job.stats()["backlog"] == 5
+
+
+def test_interval_shrinks_with_the_backlog():
+    job = Job("adaptive", None, interval=4, min_interval=0.5, backlog_target=100)
+
+    assert job.adaptive_interval(None) == 4
+    assert job.adaptive_interval(100) == 2
+    assert job.adaptive_interval(300) == 1
+    assert job.adaptive_interval(10_000) == 0.5
+
+
+def test_wakeup_runs_the_next_tick_early():
+    tick, starts = recorder()
+
+    async def main():
+        wakeup = asyncio.Event()
+        job = Job("woken", tick, interval=10, wakeup=wakeup)
+        job.start()
+        await asyncio.sleep(0.05)
+        wakeup.set()
+        await asyncio.sleep(0.05)
+        await job.stop()
+
+    asyncio.run(main())
+    assert len(starts) == 2
+
+
+def test_once_job_retries_until_it_succeeds():
+    tick, starts = recorder(fail=lambda n: n == 1)
+    job = Job("once", tick)
+    run_job(job, 0.15)
+
+    assert len(starts) == 2
+    assert job.stats()["runs"] == 1
+    assert job.stats()["mode"] == "once"
+    assert job.stats()["state"] == "stopped"
+
+
+def test_scheduler_starts_stops_and_reports_jobs():
+    tick, starts = recorder()
+    jobs = JobScheduler()
+    jobs.add(Job("a", tick, interval=0.05))
+    jobs.add(Job("b", tick))
+
+    with pytest.raises(ValueError):
+        jobs.add(Job("a", tick))
+
+    async def main():
+        tasks = jobs.start()
+        assert len(tasks) == 2
+        await asyncio.sleep(0.08)
+        await jobs.stop()
+        return tasks
+
+    tasks = asyncio.run(main())
+    assert all(task.done() for task in tasks)
+    stats = jobs.stats()
+    assert set(stats) == {"a", "b"}
+    assert stats["a"]["runs"] >= 2
+    assert stats["b"]["runs"] == 1
+    assert all(job["state"] == "stopped" for job in stats.values())
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Job("bad", None, interval=1, mode="sometimes")
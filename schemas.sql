@@ -14,15 +14,21 @@ DROP FUNCTION IF EXISTS insert_user;
 DROP FUNCTION IF EXISTS insert_shipment_request;
 DROP FUNCTION IF EXISTS update_freighter_schedule;
 DROP FUNCTION IF EXISTS get_shipment_matches;
+DROP FUNCTION IF EXISTS nearby_pending_shipments_for_schedules;
+DROP FUNCTION IF EXISTS nearby_pending_shipments;
+DROP FUNCTION IF EXISTS upsert_freighter_schedule;
+DROP FUNCTION IF EXISTS upsert_shipment_request;
+DROP FUNCTION IF EXISTS bump_last_updated;
 
 
+DROP TABLE IF EXISTS Sessions;
 DROP TABLE IF EXISTS ShipmentMatches;
 DROP TABLE IF EXISTS FreighterSchedules;
 DROP TABLE IF EXISTS ShipmentRequests;
 
 CREATE TABLE FreighterSchedules (
     ScheduleID     UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-    FreighterID    UUID REFERENCES Users(UserID) ON DELETE CASCADE,
+    FreighterID    UUID UNIQUE REFERENCES Users(UserID) ON DELETE CASCADE,  -- one schedule per freighter, see upsert_freighter_schedule
     DepartureCity  VARCHAR(255),
     DepartureLat   DOUBLE PRECISION,  -- Latitude with 6 decimal places
     DepartureLng   DOUBLE PRECISION,  -- Longitude with 6 decimal places
@@ -51,7 +57,9 @@ CREATE TABLE ShipmentRequests (
     SpecialHandling VARCHAR(255),
     Status          VARCHAR(20) CHECK (Status IN ('pending', 'matched', 'completed')),
     CreatedAt       TIMESTAMP DEFAULT NOW(),
-    LastUpdated     TIMESTAMP DEFAULT NOW()  -- Optimistic Locking
+    LastUpdated     TIMESTAMP DEFAULT NOW(),  -- Optimistic Locking
+    -- 1x1 degree grid cell of the origin (row * 360 + column), see nearby_pending_shipments
+    OriginCell      INTEGER GENERATED ALWAYS AS (floor(OriginLat + 90)::INTEGER * 360 + floor(OriginLng + 180)::INTEGER) STORED
 );
 
 CREATE TABLE ShipmentMatches (
@@ -64,3 +72,35 @@ CREATE TABLE ShipmentMatches (
     Status        VARCHAR(20) CHECK (Status IN ('matched', 'completed')),
     LastUpdated   TIMESTAMP DEFAULT NOW()  -- Optimistic Locking
 );
+
+-- Keyset pagination / filter indexes for the list endpoints (see python/pagination.py)
+CREATE INDEX IF NOT EXISTS idx_freighterschedules_created ON FreighterSchedules (CreatedAt, ScheduleID);
+CREATE INDEX IF NOT EXISTS idx_freighterschedules_status_created ON FreighterSchedules (Status, CreatedAt, ScheduleID);
+CREATE INDEX IF NOT EXISTS idx_freighterschedules_freighter_created ON FreighterSchedules (FreighterID, CreatedAt, ScheduleID);
+
+CREATE INDEX IF NOT EXISTS idx_shipmentrequests_created ON ShipmentRequests (CreatedAt, RequestID);
+CREATE INDEX IF NOT EXISTS idx_shipmentrequests_status_created ON ShipmentRequests (Status, CreatedAt, RequestID);
+CREATE INDEX IF NOT EXISTS idx_shipmentrequests_client_created ON ShipmentRequests (ClientID, CreatedAt, RequestID);
+
+CREATE INDEX IF NOT EXISTS idx_shipmentmatches_matched ON ShipmentMatches (MatchedAt, MatchID);
+CREATE INDEX IF NOT EXISTS idx_shipmentmatches_status_matched ON ShipmentMatches (Status, MatchedAt, MatchID);
+CREATE INDEX IF NOT EXISTS idx_shipmentmatches_client_matched ON ShipmentMatches (ClientID, MatchedAt, MatchID);
+CREATE INDEX IF NOT EXISTS idx_shipmentmatches_freighter_matched ON ShipmentMatches (FreighterID, MatchedAt, MatchID);
+
+-- Spatial lookup of pending shipments by origin grid cell (see stored-procedures/nearby_pending_shipments.sql)
+CREATE INDEX IF NOT EXISTS idx_shipmentrequests_pending_origincell ON ShipmentRequests (OriginCell) WHERE Status = 'pending';
+
+-- Incremental exports (?since=) scan by last update
+CREATE INDEX IF NOT EXISTS idx_shipmentrequests_lastupdated ON ShipmentRequests (LastUpdated);
+CREATE INDEX IF NOT EXISTS idx_shipmentmatches_lastupdated ON ShipmentMatches (LastUpdated);
+
+-- Access tokens and active users shared by all API workers (see python/sessions.py).
+-- Unlogged: session state is disposable and should not cost WAL writes.
+CREATE UNLOGGED TABLE Sessions (
+    UserID          UUID PRIMARY KEY,
+    Token           TEXT,
+    TokenExpiresAt  TIMESTAMP,
+    Name            VARCHAR(255),
+    Role            VARCHAR(20),
+    ActiveExpiresAt TIMESTAMP
+);
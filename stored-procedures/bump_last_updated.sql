@@ -0,0 +1,9 @@
+CREATE OR REPLACE FUNCTION bump_last_updated(p_last_updated TIMESTAMP)
+RETURNS TIMESTAMP
+LANGUAGE sql
+VOLATILE
+AS $$
+    -- LastUpdated is the optimistic-locking version: it must change on every
+    -- write, even two writes within the same microsecond or transaction.
+    SELECT GREATEST(clock_timestamp()::TIMESTAMP, p_last_updated + INTERVAL '1 microsecond');
+$$;
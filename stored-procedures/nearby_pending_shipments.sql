@@ -0,0 +1,45 @@
+CREATE OR REPLACE FUNCTION nearby_pending_shipments(
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_radius_km DOUBLE PRECISION,
+    p_max_weight_kg DECIMAL(10,2),
+    p_limit INTEGER
+) RETURNS TABLE (
+    requestid UUID,
+    distancekm DOUBLE PRECISION
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    -- One degree of latitude is ~111 km; a degree of longitude shrinks with cos(lat)
+    lat_span DOUBLE PRECISION := p_radius_km / 111.0;
+    lng_span DOUBLE PRECISION := p_radius_km / (111.0 * GREATEST(cos(radians(LEAST(abs(p_lat) + p_radius_km / 111.0, 89.0))), 0.01));
+    min_row INTEGER := GREATEST(floor(p_lat + 90 - lat_span)::INTEGER, 0);
+    max_row INTEGER := LEAST(floor(p_lat + 90 + lat_span)::INTEGER, 180);
+    min_col INTEGER := floor(p_lng + 180 - lng_span)::INTEGER;
+    max_col INTEGER := LEAST(floor(p_lng + 180 + lng_span)::INTEGER, floor(p_lng + 180 - lng_span)::INTEGER + 359);
+BEGIN
+    -- Only the grid cells the radius can reach are read, through
+    -- idx_shipmentrequests_pending_origincell; exact distances are computed
+    -- for those rows alone.
+    RETURN QUERY
+    SELECT s.RequestID, d.km
+    FROM public."shipmentrequests" s
+    CROSS JOIN LATERAL (
+        SELECT 6371 * 2 * asin(LEAST(1.0, sqrt(
+            power(sin(radians(s.OriginLat - p_lat) / 2), 2) +
+            cos(radians(p_lat)) * cos(radians(s.OriginLat)) * power(sin(radians(s.OriginLng - p_lng) / 2), 2)
+        ))) AS km
+    ) d
+    WHERE s.Status = 'pending'
+      AND s.OriginCell = ANY (ARRAY(
+          SELECT r * 360 + ((c % 360) + 360) % 360
+          FROM generate_series(min_row, max_row) AS r, generate_series(min_col, max_col) AS c
+      ))
+      AND s.WeightKg <= p_max_weight_kg
+      AND d.km <= p_radius_km
+    ORDER BY d.km, s.CreatedAt, s.RequestID
+    LIMIT p_limit;
+END;
+$$;
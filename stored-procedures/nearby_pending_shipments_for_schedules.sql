@@ -0,0 +1,23 @@
+CREATE OR REPLACE FUNCTION nearby_pending_shipments_for_schedules(
+    p_schedule_ids UUID[],
+    p_radius_km DOUBLE PRECISION,
+    p_limit INTEGER
+) RETURNS TABLE (
+    scheduleid UUID,
+    requestid UUID,
+    distancekm DOUBLE PRECISION
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+    -- Up to p_limit candidates per schedule, nearest first, in the order the schedules were given
+    RETURN QUERY
+    SELECT f.ScheduleID, n.requestid, n.distancekm
+    FROM unnest(p_schedule_ids) WITH ORDINALITY AS ids(id, position)
+    JOIN public."freighterschedules" f ON f.ScheduleID = ids.id
+    CROSS JOIN LATERAL nearby_pending_shipments(f.DepartureLat, f.DepartureLng, p_radius_km, f.AvailableKg, p_limit)
+        WITH ORDINALITY AS n(requestid, distancekm, rank)
+    ORDER BY ids.position, n.rank;
+END;
+$$;
@@ -0,0 +1,72 @@
+CREATE OR REPLACE FUNCTION upsert_freighter_schedule(
+    p_freighter_id UUID,
+    p_departure_city VARCHAR,
+    p_departure_lat DOUBLE PRECISION,
+    p_departure_lng DOUBLE PRECISION,
+    p_arrival_city VARCHAR,
+    p_arrival_lat DOUBLE PRECISION,
+    p_arrival_lng DOUBLE PRECISION,
+    p_departure_date TIMESTAMP,
+    p_arrival_date TIMESTAMP,
+    p_max_load_kg DECIMAL(10,2),
+    p_available_kg DECIMAL(10,2),
+    p_status VARCHAR,
+    p_expected_last_updated TIMESTAMP DEFAULT NULL
+) RETURNS TABLE (
+    scheduleid UUID,
+    freighterid UUID,
+    departurecity VARCHAR,
+    departurelat DOUBLE PRECISION,
+    departurelng DOUBLE PRECISION,
+    arrivalcity VARCHAR,
+    arrivallat DOUBLE PRECISION,
+    arrivallng DOUBLE PRECISION,
+    departuredate TIMESTAMP,
+    arrivaldate TIMESTAMP,
+    maxloadkg DECIMAL(10,2),
+    availablekg DECIMAL(10,2),
+    status VARCHAR,
+    createdat TIMESTAMP,
+    lastupdated TIMESTAMP
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY 
+    INSERT INTO public."freighterschedules" (
+        FreighterID, DepartureCity, DepartureLat, DepartureLng, 
+        ArrivalCity, ArrivalLat, ArrivalLng, 
+        DepartureDate, ArrivalDate, 
+        MaxLoadKg, AvailableKg, Status
+    ) VALUES (
+        p_freighter_id, p_departure_city, p_departure_lat, p_departure_lng,
+        p_arrival_city, p_arrival_lat, p_arrival_lng,
+        p_departure_date, p_arrival_date,
+        p_max_load_kg, p_available_kg, p_status
+    )
+    -- One schedule per freighter. A repost from the same departure point is a no-op and returns no row,
+    -- as is an update whose p_expected_last_updated no longer matches (compare-and-swap).
+    ON CONFLICT ON CONSTRAINT freighterschedules_freighterid_key DO UPDATE
+    SET 
+        DepartureCity = EXCLUDED.DepartureCity,
+        DepartureLat = EXCLUDED.DepartureLat,
+        DepartureLng = EXCLUDED.DepartureLng,
+        ArrivalCity = EXCLUDED.ArrivalCity,
+        ArrivalLat = EXCLUDED.ArrivalLat,
+        ArrivalLng = EXCLUDED.ArrivalLng,
+        DepartureDate = EXCLUDED.DepartureDate,
+        ArrivalDate = EXCLUDED.ArrivalDate,
+        MaxLoadKg = EXCLUDED.MaxLoadKg,
+        AvailableKg = EXCLUDED.AvailableKg,
+        Status = EXCLUDED.Status,
+        LastUpdated = bump_last_updated(freighterschedules.LastUpdated)
+    WHERE (freighterschedules.DepartureLat, freighterschedules.DepartureLng)
+        IS DISTINCT FROM (EXCLUDED.DepartureLat, EXCLUDED.DepartureLng)
+      AND (p_expected_last_updated IS NULL OR freighterschedules.LastUpdated = p_expected_last_updated)
+    RETURNING 
+        freighterschedules.ScheduleID, freighterschedules.FreighterID, freighterschedules.DepartureCity, freighterschedules.DepartureLat, freighterschedules.DepartureLng,
+        freighterschedules.ArrivalCity, freighterschedules.ArrivalLat, freighterschedules.ArrivalLng,
+        freighterschedules.DepartureDate, freighterschedules.ArrivalDate, 
+        freighterschedules.MaxLoadKg, freighterschedules.AvailableKg, freighterschedules.Status, freighterschedules.CreatedAt, freighterschedules.LastUpdated;
+END;
+$$;
@@ -0,0 +1,59 @@
+CREATE OR REPLACE FUNCTION upsert_shipment_request(
+    p_request_id UUID,
+    p_client_id UUID,
+    p_origin_city VARCHAR,
+    p_origin_lat DOUBLE PRECISION,
+    p_origin_lng DOUBLE PRECISION,
+    p_destination_city VARCHAR,
+    p_destination_lat DOUBLE PRECISION,
+    p_destination_lng DOUBLE PRECISION,
+    p_weight_kg DECIMAL(10,2),
+    p_special_handling VARCHAR,
+    p_status VARCHAR,
+    p_expected_last_updated TIMESTAMP DEFAULT NULL
+) RETURNS TABLE (
+    requestid UUID,
+    clientid UUID,
+    origincity VARCHAR,
+    originlat DOUBLE PRECISION,
+    originlng DOUBLE PRECISION,
+    destinationcity VARCHAR,
+    destinationlat DOUBLE PRECISION,
+    destinationlng DOUBLE PRECISION,
+    weightkg DECIMAL(10,2),
+    specialhandling VARCHAR,
+    status VARCHAR,
+    createdat TIMESTAMP,
+    lastupdated TIMESTAMP
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RETURN QUERY 
+    INSERT INTO public."shipmentrequests" (
+        RequestID, ClientID, OriginCity, OriginLat, OriginLng, DestinationCity, DestinationLat, DestinationLng, WeightKg, SpecialHandling, Status
+    ) VALUES (
+        p_request_id, p_client_id, p_origin_city, p_origin_lat, p_origin_lng, 
+        p_destination_city, p_destination_lat, p_destination_lng, 
+        p_weight_kg, p_special_handling, p_status
+    )
+    -- An update whose p_expected_last_updated no longer matches returns no row (compare-and-swap)
+    ON CONFLICT ON CONSTRAINT shipmentrequests_pkey DO UPDATE
+    SET 
+        ClientID = EXCLUDED.ClientID,
+        OriginCity = EXCLUDED.OriginCity,
+        OriginLat = EXCLUDED.OriginLat,
+        OriginLng = EXCLUDED.OriginLng,
+        DestinationCity = EXCLUDED.DestinationCity,
+        DestinationLat = EXCLUDED.DestinationLat,
+        DestinationLng = EXCLUDED.DestinationLng,
+        WeightKg = EXCLUDED.WeightKg,
+        SpecialHandling = EXCLUDED.SpecialHandling,
+        Status = EXCLUDED.Status,
+        LastUpdated = bump_last_updated(shipmentrequests.LastUpdated)
+    WHERE p_expected_last_updated IS NULL OR shipmentrequests.LastUpdated = p_expected_last_updated
+    RETURNING 
+        shipmentrequests.RequestID, shipmentrequests.ClientID, shipmentrequests.OriginCity, shipmentrequests.OriginLat, shipmentrequests.OriginLng, shipmentrequests.DestinationCity, shipmentrequests.DestinationLat, shipmentrequests.DestinationLng, shipmentrequests.
+        WeightKg, shipmentrequests.SpecialHandling, shipmentrequests.Status, shipmentrequests.CreatedAt, shipmentrequests.LastUpdated;
+END;
+$$;